@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.apps import apps
 
-from .models import User, Profile, Recommendation, Country, Publication
+from .models import User, Profile, Recommendation, Country, Publication, OutboxEmail
 from .forms import PublicationAdminForm, UserAdminForm, ProfileAdminForm
 
 
@@ -64,6 +64,14 @@ class PublicationAdmin(admin.ModelAdmin):
         return initial
 
 
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'to', 'created_at', 'attempts', 'sent_at', 'failed_at')
+    search_fields = ('subject', 'to')
+    readonly_fields = ('created_at', 'attempts', 'last_error', 'sent_at')
+    # the links of the e-mails are for their recipients only
+    exclude = ('body', 'html_body')
+
+
 admin.site.site_header = 'WiNRepo Admin'
 
 for model in apps.get_models():
@@ -75,3 +83,4 @@ admin.site.register(Profile, ProfileAdmin)
 admin.site.register(Recommendation, RecommendationAdmin)
 admin.site.register(Country, CountryAdmin)
 admin.site.register(Publication, PublicationAdmin)
+admin.site.register(OutboxEmail, OutboxEmailAdmin)
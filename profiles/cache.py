@@ -0,0 +1,135 @@
+"""
+Versioned cache entries.
+
+Entries belong to a group ('profiles', ...) whose version is part of their
+key. Bumping the version of a group invalidates all of its entries at once,
+the stale ones simply expire. The versions live in the default cache, the
+entries in the cache alias of their use ('pages', 'api', see settings).
+Nothing is cached unless settings.VERSIONED_CACHE, when the versions are not
+shared by the processes.
+
+Hits and misses are counted by group in each process, see ``stats``.
+"""
+import hashlib
+import time
+from collections import Counter
+from functools import wraps
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import caches
+
+DEFAULT_TIMEOUT = 60 * 60
+
+NAMESPACE = 'profiles'
+
+counters = Counter()
+
+
+def version_key(group):
+    return f'{NAMESPACE}:version:{group}'
+
+
+def get_version(group):
+    cache = caches['default']
+    version = cache.get(version_key(group))
+    if version is None:
+        # start from the clock so that entries of a lost version never match
+        cache.add(version_key(group), time.time_ns(), None)
+        version = cache.get(version_key(group), 0)
+    return version
+
+
+def bump_version(group):
+    cache = caches['default']
+    try:
+        cache.incr(version_key(group))
+    except ValueError:
+        cache.set(version_key(group), time.time_ns(), None)
+
+
+def make_key(group, *parts):
+    digest = hashlib.md5(repr(parts).encode()).hexdigest()
+    return f'{NAMESPACE}:{group}:{get_version(group)}:{digest}'
+
+
+def count(group, hit):
+    counters[group, 'hits' if hit else 'misses'] += 1
+
+
+def stats():
+    """{group: {'hits': ..., 'misses': ...}} of this process."""
+    groups = {}
+    for (group, outcome), value in counters.items():
+        groups.setdefault(group, {'hits': 0, 'misses': 0})[outcome] = value
+    return groups
+
+
+def get_or_set(group, parts, default, timeout=DEFAULT_TIMEOUT, alias='default'):
+    """Cached value of ``default()`` for ``parts`` in the current version."""
+    if not settings.VERSIONED_CACHE:
+        return default()
+    cache = caches[alias]
+    key = make_key(group, *parts)
+    value = cache.get(key)
+    count(group, value is not None)
+    if value is None:
+        value = default()
+        cache.set(key, value, timeout)
+    return value
+
+
+def page_key(request, groups):
+    versions = tuple(get_version(group) for group in groups)
+    # partial answers of the same URL, see ListProfiles
+    partial = request.headers.get('X-Requested-With')
+    return make_key('pages', versions, request.get_full_path(), partial)
+
+
+def is_cacheable(request, response):
+    """Whether ``response`` is the same for every anonymous visitor."""
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and not request.META.get('CSRF_COOKIE_USED')
+        and not request.session.modified
+        and not len(messages.get_messages(request))
+    )
+
+
+def cache_anonymous_page(*groups, timeout=DEFAULT_TIMEOUT):
+    """
+    Caches the pages of anonymous visitors by URL until one of ``groups``
+    changes. Pages with messages, cookies or a CSRF token are not cached.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (
+                not settings.VERSIONED_CACHE
+                or request.method != 'GET'
+                or request.user.is_authenticated
+                or len(messages.get_messages(request))
+            ):
+                return view(request, *args, **kwargs)
+
+            cache = caches['pages']
+            key = page_key(request, groups)
+            response = cache.get(key)
+            count('pages', response is not None)
+            if response is not None:
+                return response
+
+            def store(response):
+                if is_cacheable(request, response):
+                    cache.set(key, response, timeout)
+
+            response = view(request, *args, **kwargs)
+            if callable(getattr(response, 'render', None)):
+                response.add_post_render_callback(store)
+            else:
+                store(response)
+            return response
+        return wrapper
+    return decorator
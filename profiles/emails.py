@@ -1,7 +1,25 @@
-from django.core.mail import EmailMultiAlternatives
+import logging
+from datetime import timedelta
+from io import BytesIO
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
 from django.template import loader
+from django.utils import timezone
+
+from .models import OutboxEmail, PasswordResetRequest, User
+from .tokens import UserPasswordResetToken
+
+logger = logging.getLogger(__name__)
 
-import winrepo.settings as settings
+# attempts of the outbox to send an e-mail, retried after 1, 2, 4... minutes
+OUTBOX_MAX_ATTEMPTS = 6
+OUTBOX_RETRY_DELAY = timedelta(minutes=1)
+# time a worker has to send the e-mails it picked before others retry them
+OUTBOX_LEASE = timedelta(minutes=10)
 
 
 def build_email(subject_template_name, email_template_name, html_email_template_name, context=None, reply=False):
@@ -23,6 +41,129 @@ def build_email(subject_template_name, email_template_name, html_email_template_
     return email_message
 
 
+def send_email(message):
+    """
+    Send ``message``, through the outbox with ``EMAIL_OUTBOX`` so that the
+    request does not wait for the mail provider.
+    """
+    if not settings.EMAIL_OUTBOX:
+        message.send()
+        return
+    enqueue_email(message)
+
+
+def enqueue_email(message):
+    """Queue ``message`` for the send_outbox command, whatever ``EMAIL_OUTBOX``."""
+    html_body = next((
+        content for content, mimetype in message.alternatives
+        if mimetype == 'text/html'
+    ), '')
+    OutboxEmail.objects.create(
+        subject=message.subject,
+        body=message.body,
+        html_body=html_body,
+        from_email=message.from_email,
+        to=message.to,
+        headers=message.extra_headers,
+    )
+
+
+def base_request(base_url):
+    """A request to ``base_url``, for the links of the e-mails of the workers."""
+    url = urlsplit(base_url)
+    return WSGIRequest({
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': '/',
+        'HTTP_HOST': url.netloc,
+        'wsgi.url_scheme': url.scheme,
+        'wsgi.input': BytesIO(),
+    })
+
+
+def send_password_resets(batch_size=100):
+    """
+    Queue the e-mails of a batch of password reset requests in the outbox,
+    returns the number of requests handled. The accounts are looked up here
+    rather than in the request, which answers the same whether they exist.
+    """
+    handled = 0
+    for reset in PasswordResetRequest.objects.all()[:batch_size]:
+        with transaction.atomic():
+            # claim it, another worker may have picked it too
+            if not PasswordResetRequest.objects.filter(pk=reset.pk).delete()[0]:
+                continue
+            handled += 1
+            user = User.objects.filter(email=reset.email).first()
+            if user is None:
+                continue
+            token = UserPasswordResetToken.generate(user)
+            enqueue_email(user_reset_password_email(
+                base_request(reset.base_url), user, token,
+            ))
+    return handled
+
+
+def outbox_message(email, connection=None):
+    message = EmailMultiAlternatives(
+        email.subject, email.body, email.from_email, email.to,
+        headers=email.headers, connection=connection,
+    )
+    if email.html_body:
+        message.attach_alternative(email.html_body, 'text/html')
+    return message
+
+
+def send_outbox(batch_size=100):
+    """Send a batch of the pending e-mails, returns the (sent, failed) counts."""
+    now = timezone.now()
+    pending = list(OutboxEmail.objects.pending(now)[:batch_size])
+    sent = failed = 0
+    if not pending:
+        return sent, failed
+
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception:
+        logger.exception('Failed to connect to the e-mail backend.')
+        return sent, failed
+
+    try:
+        for email in pending:
+            # claim it, another worker may have picked it too
+            claimed = OutboxEmail.objects.filter(
+                pk=email.pk, send_after=email.send_after, sent_at=None,
+            ).update(send_after=now + OUTBOX_LEASE)
+            if not claimed:
+                continue
+
+            email.attempts += 1
+            try:
+                outbox_message(email, connection).send()
+            except Exception as e:
+                logger.exception('Failed to send outbox e-mail %s.', email.pk)
+                failed += 1
+                email.last_error = f'{type(e).__name__}: {e}'
+                if email.attempts >= OUTBOX_MAX_ATTEMPTS:
+                    email.failed_at = timezone.now()
+                email.send_after = timezone.now() + (
+                    OUTBOX_RETRY_DELAY * 2 ** (email.attempts - 1)
+                )
+            else:
+                sent += 1
+                email.sent_at = timezone.now()
+                # the body may hold links that still work, keep only a trace
+                email.body = email.html_body = ''
+            email.save(update_fields=[
+                'attempts', 'last_error', 'send_after', 'sent_at', 'failed_at',
+                'body', 'html_body',
+            ])
+    finally:
+        connection.close()
+
+    return sent, failed
+
+
 def user_update_email(
     request, user,
     subject_template_name='account/user_update_email_subject.txt',
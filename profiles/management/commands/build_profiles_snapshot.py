@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from profiles.snapshots import build_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Write the compressed snapshots of the profile search dataset.'
+
+    def handle(self, *args, **kwargs):
+        version = build_snapshot()
+        self.stdout.write(f'Built the snapshots of version {version}.')
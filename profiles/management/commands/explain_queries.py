@@ -0,0 +1,116 @@
+import re
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory
+from rest_framework.request import Request
+
+from profiles.models import PositionStatistic, Profile
+from profiles.sitemaps import ProfilesSitemap
+from profiles.views import ListProfiles, ProfileSearchViewSet
+
+LISTED = ('profile_listed_idx',)
+
+# index names in the plans of SQLite, MySQL (JSON format) and PostgreSQL
+INDEX_RE = re.compile(
+    r'USING (?:COVERING )?INDEX (\w+)'
+    r'|"key": "(\w+)"'
+    r'|Index (?:Only )?Scan using (\w+)'
+    r'|Bitmap Index Scan on (\w+)'
+)
+
+
+def column_indexes(column):
+    """Names of the single column indexes on ``column``."""
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(
+            cursor, Profile._meta.db_table,
+        )
+    return tuple(
+        name for name, constraint in constraints.items()
+        if constraint['index'] and constraint['columns'] == [column]
+    )
+
+
+def hot_queries():
+    """(description, queryset, planned indexes) of the hot Profile queries."""
+    factory = RequestFactory()
+
+    def list_profiles(**params):
+        view = ListProfiles(request=factory.get('/repo/', params), kwargs={})
+        return view.get_queryset()[:view.paginate_by + 1]
+
+    search_api = ProfileSearchViewSet(
+        request=Request(factory.get('/api/profiles/')), format_kwarg=None,
+    )
+    sitemap = ProfilesSitemap()
+
+    return [
+        ('Repository list', list_profiles(), LISTED),
+        (
+            'Repository list, senior positions',
+            list_profiles(senior='on'),
+            LISTED + column_indexes('seniority'),
+        ),
+        (
+            'Repository list, under-represented countries',
+            list_profiles(ur='on'),
+            LISTED + column_indexes('country_is_under_represented'),
+        ),
+        ('Search API', search_api.get_queryset(), LISTED),
+        (
+            'Sitemap',
+            sitemap.items()[:sitemap.limit],
+            ('profile_listed_idx', 'profile_listed_name_idx'),
+        ),
+        (
+            'Latest change',
+            Profile.objects.filter(is_public=True)
+            .order_by('-updated_at').values('updated_at')[:1],
+            ('profile_listed_updated_idx',),
+        ),
+        (
+            'Unclaimed profile by contact e-mail',
+            Profile.objects.filter(contact_email='', user__isnull=True),
+            ('profile_contact_email_idx',),
+        ),
+        (
+            'Position statistics refresh',
+            PositionStatistic.counts(position__in=['Professor']),
+            ('profile_position_alive_idx',),
+        ),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Run EXPLAIN on the hot profile queries and check their indexes.'
+
+    def handle(self, *args, **kwargs):
+        # the key chosen by MySQL only stands apart from the possible keys
+        # in the JSON format
+        options = {'format': 'json'} if connection.vendor == 'mysql' else {}
+
+        missing = 0
+        for description, queryset, planned in hot_queries():
+            plan = queryset.explain(**options)
+            used = [
+                next(filter(None, names))
+                for names in INDEX_RE.findall(plan)
+            ]
+            if set(used) & set(planned):
+                self.stdout.write(self.style.SUCCESS(
+                    f'{description}: uses {", ".join(used)}'
+                ))
+            else:
+                missing += 1
+                self.stdout.write(self.style.WARNING(
+                    f'{description}: uses {", ".join(used) or "no index"}, '
+                    f'expected one of {", ".join(planned)}'
+                ))
+
+            if kwargs['verbosity'] > 1:
+                self.stdout.write(plan)
+
+        self.stdout.write(
+            f'{missing} of the hot queries do not use their planned indexes.'
+        )
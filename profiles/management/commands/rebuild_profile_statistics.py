@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from profiles.models import CountryStatistic, PositionStatistic
+
+
+class Command(BaseCommand):
+    help = 'Recount the listed profiles of every country and position.'
+
+    def handle(self, *args, **kwargs):
+        with transaction.atomic():
+            countries = CountryStatistic.rebuild()
+            positions = PositionStatistic.rebuild()
+        self.stdout.write(
+            f'Rebuilt the statistics of {countries} countries '
+            f'and {positions} positions.'
+        )
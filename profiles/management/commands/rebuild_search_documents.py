@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from profiles import cache
+from profiles.models import Profile
+from profiles.search import rebuild_search_documents
+
+
+class Command(BaseCommand):
+    help = 'Recompute the search document and tokens of every profile.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', default=500, type=int, help='Profiles updated per query')
+
+    def handle(self, *args, **kwargs):
+        count = rebuild_search_documents(
+            Profile.all_objects.all(),
+            chunk_size=kwargs['chunk_size'],
+        )
+        cache.bump_version('profiles')
+        self.stdout.write(f'Rebuilt the search documents of {count} profiles.')
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from profiles.emails import send_outbox, send_password_resets
+
+
+class Command(BaseCommand):
+    help = 'Queue the password reset e-mails, send the pending e-mails of the outbox.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Keep sending the new e-mails, as a worker.',
+        )
+        parser.add_argument(
+            '--interval', type=float, default=5,
+            help='Seconds to wait when the outbox is empty, with --loop.',
+        )
+
+    def handle(self, *args, batch_size, loop, interval, **kwargs):
+        while True:
+            resets = send_password_resets(batch_size)
+            sent, failed = send_outbox(batch_size)
+            if sent or failed or not loop:
+                self.stdout.write(f'Sent {sent} e-mails, {failed} failed.')
+            if not loop:
+                return
+            if resets < batch_size and sent + failed < batch_size:
+                close_old_connections()
+                time.sleep(interval)
@@ -0,0 +1,89 @@
+# Generated by Django 3.2 on 2026-10-18 15:02
+
+from django.db import migrations, models
+
+FTS_TABLE = 'profiles_profile_fts'
+
+FACETS = ('brain_structure', 'modalities', 'methods', 'domains')
+
+
+def choice_codes(value):
+    if isinstance(value, str):
+        return [code.strip() for code in value.split(',') if code.strip()]
+    return list(value or ())
+
+
+def build_search_document(profile, labels):
+    parts = [
+        profile.name,
+        profile.institution,
+        profile.position,
+        profile.country.name if profile.country_id else '',
+        profile.keywords,
+    ]
+    for facet in FACETS:
+        parts += [
+            labels[facet].get(code, code)
+            for code in choice_codes(getattr(profile, facet))
+        ]
+    return ' '.join(filter(None, parts))
+
+
+def populate_search_documents(apps, schema_editor):
+    Profile = apps.get_model('profiles', 'Profile')
+    labels = {
+        facet: dict(Profile._meta.get_field(facet).flatchoices)
+        for facet in FACETS
+    }
+    for profile in Profile.objects.select_related('country').iterator():
+        Profile.objects.filter(pk=profile.pk).update(
+            search_document=build_search_document(profile, labels),
+        )
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'mysql':
+        schema_editor.execute(
+            'CREATE FULLTEXT INDEX profiles_profile_search_document_ft '
+            'ON profiles_profile (search_document)'
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5('
+            f"search_document, tokenize='unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, search_document) '
+            f'SELECT id, search_document FROM profiles_profile'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'mysql':
+        schema_editor.execute(
+            'DROP INDEX profiles_profile_search_document_ft '
+            'ON profiles_profile'
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='search_document',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(
+            populate_search_documents, migrations.RunPython.noop,
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
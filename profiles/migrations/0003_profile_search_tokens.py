@@ -0,0 +1,83 @@
+# Generated by Django 3.2 on 2026-10-18 15:20
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+FTS_TABLE = 'profiles_profile_fts'
+
+FACETS = ('brain_structure', 'modalities', 'methods', 'domains')
+
+WORD_RE = re.compile(r'\w+')
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', text or '')
+    return ''.join(c for c in text if not unicodedata.combining(c)).lower()
+
+
+def choice_codes(value):
+    if isinstance(value, str):
+        return [code.strip() for code in value.split(',') if code.strip()]
+    return list(value or ())
+
+
+def build_search_document(profile, labels):
+    parts = [
+        profile.name,
+        profile.institution,
+        profile.position,
+        profile.country.name if profile.country_id else '',
+        profile.keywords,
+    ]
+    for facet in FACETS:
+        parts += [
+            labels[facet].get(code, code)
+            for code in choice_codes(getattr(profile, facet))
+        ]
+    return normalize(' '.join(filter(None, parts)))
+
+
+def build_search_tokens(document):
+    return ' {} '.format(' '.join(sorted(set(WORD_RE.findall(document)))))
+
+
+def normalize_search_documents(apps, schema_editor):
+    Profile = apps.get_model('profiles', 'Profile')
+    labels = {
+        facet: dict(Profile._meta.get_field(facet).flatchoices)
+        for facet in FACETS
+    }
+    for profile in Profile.objects.select_related('country').iterator():
+        document = build_search_document(profile, labels)
+        Profile.objects.filter(pk=profile.pk).update(
+            search_document=document,
+            search_tokens=build_search_tokens(document),
+        )
+
+    # MySQL keeps its FULLTEXT index up to date, the FTS5 table is a copy
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DELETE FROM {FTS_TABLE}')
+        schema_editor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, search_document) '
+            f'SELECT id, search_document FROM profiles_profile'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0002_profile_search_document'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='search_tokens',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(
+            normalize_search_documents, migrations.RunPython.noop,
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 3.2 on 2026-10-18 15:05
+
+from functools import reduce
+from operator import or_
+
+from django.db import migrations
+import profiles.models
+
+FACETS = ('brain_structure', 'modalities', 'methods', 'domains')
+
+
+def choice_codes(value):
+    if isinstance(value, str):
+        return [code.strip() for code in value.split(',') if code.strip()]
+    return list(value or ())
+
+
+def convert_facets(apps, schema_editor):
+    Profile = apps.get_model('profiles', 'Profile')
+    # bit i stands for the i-th choice of the facet
+    bits = {
+        facet: {
+            code: 1 << i
+            for i, (code, _) in enumerate(Profile._meta.get_field(facet).choices)
+        }
+        for facet in FACETS
+    }
+    for profile in Profile.objects.iterator():
+        masks = {
+            f'{facet}_mask': reduce(or_, (
+                bits[facet].get(code, 0)
+                for code in choice_codes(getattr(profile, facet))
+            ), 0)
+            for facet in FACETS
+        }
+        Profile.objects.filter(pk=profile.pk).update(**masks)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0003_profile_search_tokens'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='brain_structure_mask',
+            field=profiles.models.BitmaskField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='domains_mask',
+            field=profiles.models.BitmaskField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='methods_mask',
+            field=profiles.models.BitmaskField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='modalities_mask',
+            field=profiles.models.BitmaskField(db_index=True, default=0, editable=False),
+        ),
+        migrations.RunPython(convert_facets, migrations.RunPython.noop),
+    ]
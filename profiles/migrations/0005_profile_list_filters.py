@@ -0,0 +1,48 @@
+# Generated by Django 3.2 on 2026-10-18 15:14
+
+from django.db import migrations, models
+
+JUNIOR, SENIOR = 1, 2
+
+POSITION_SENIORITY = {
+    'PhD student': JUNIOR,
+    'Medical Doctor': JUNIOR,
+    'Post-doctoral researcher': JUNIOR,
+    'Researcher/ scientist': JUNIOR,
+    'Senior researcher/ scientist': SENIOR,
+    'Lecturer': SENIOR,
+    'Assistant Professor': SENIOR,
+    'Associate Professor': SENIOR,
+    'Professor': SENIOR,
+    'Group leader/ Director/ Head of Department': SENIOR,
+}
+
+
+def populate_list_filters(apps, schema_editor):
+    Profile = apps.get_model('profiles', 'Profile')
+    for position, seniority in POSITION_SENIORITY.items():
+        Profile.objects.filter(position=position).update(seniority=seniority)
+    Profile.objects.filter(country__is_under_represented=True).update(
+        country_is_under_represented=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0004_profile_facet_masks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='country_is_under_represented',
+            field=models.BooleanField(db_index=True, default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='seniority',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'Unknown'), (1, 'Junior'), (2, 'Senior')], db_index=True, default=0, editable=False),
+        ),
+        migrations.RunPython(populate_list_filters, migrations.RunPython.noop),
+    ]
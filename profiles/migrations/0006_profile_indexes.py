@@ -0,0 +1,62 @@
+# Generated by Django 3.2 on 2026-10-18 15:17
+
+from django.db import migrations, models
+
+# (name, columns, condition) of the indexes restricted to the listed
+# profiles, on the databases supporting partial indexes; MySQL falls back
+# on profile_listed_published_idx
+PARTIAL_INDEXES = (
+    (
+        'profile_listed_idx',
+        'published_at DESC, id DESC',
+        'is_public AND deleted_at IS NULL',
+    ),
+)
+
+
+def create_partial_indexes(apps, schema_editor):
+    if not schema_editor.connection.features.supports_partial_indexes:
+        return
+    for name, columns, condition in PARTIAL_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX {name} ON profiles_profile ({columns}) '
+            f'WHERE {condition}'
+        )
+
+
+def drop_partial_indexes(apps, schema_editor):
+    if not schema_editor.connection.features.supports_partial_indexes:
+        return
+    for name, _, _ in PARTIAL_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0005_profile_list_filters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['is_public', 'deleted_at', '-published_at'], name='profile_listed_published_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['is_public', 'deleted_at', 'name', 'institution', 'updated_at'], name='profile_listed_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['is_public', 'deleted_at', 'updated_at'], name='profile_listed_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['position', 'deleted_at'], name='profile_position_alive_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['contact_email', 'user'], name='profile_contact_email_idx'),
+        ),
+        migrations.RunPython(create_partial_indexes, drop_partial_indexes),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 3.2 on 2026-10-18 15:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_statistics(apps, schema_editor):
+    Profile = apps.get_model('profiles', 'Profile')
+    listed = Profile.objects.filter(is_public=True, deleted_at=None).order_by()
+    for model_name, key in (
+        ('CountryStatistic', 'country_id'), ('PositionStatistic', 'position'),
+    ):
+        Statistic = apps.get_model('profiles', model_name)
+        counts = listed.exclude(**{key: None}).values(key).annotate(
+            count=models.Count('pk'),
+        ).values_list(key, 'count')
+        Statistic.objects.bulk_create(
+            Statistic(**{key: value}, profiles_count=count)
+            for value, count in counts
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0006_profile_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CountryStatistic',
+            fields=[
+                ('profiles_count', models.PositiveIntegerField(default=0)),
+                ('country', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='statistic', serialize=False, to='profiles.country')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='PositionStatistic',
+            fields=[
+                ('profiles_count', models.PositiveIntegerField(default=0)),
+                ('position', models.CharField(choices=[('PhD student', 'PhD student'), ('Medical Doctor', 'Medical Doctor'), ('Post-doctoral researcher', 'Post-doctoral researcher'), ('Senior researcher/ scientist', 'Senior researcher/ scientist'), ('Lecturer', 'Lecturer'), ('Assistant Professor', 'Assistant Professor'), ('Associate Professor', 'Associate Professor'), ('Professor', 'Professor'), ('Group leader/ Director/ Head of Department', 'Group leader/ Director/ Head of Department')], max_length=50, primary_key=True, serialize=False)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.RunPython(populate_statistics, migrations.RunPython.noop),
+    ]
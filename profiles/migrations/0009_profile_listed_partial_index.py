@@ -0,0 +1,31 @@
+# Generated by Django 3.2 on 2026-10-18 16:08
+
+from django.db import migrations, models
+
+
+def drop_raw_partial_index(apps, schema_editor):
+    # created outside of the migration state by 0006, the index is now
+    # declared by the model
+    if schema_editor.connection.features.supports_partial_indexes:
+        schema_editor.execute('DROP INDEX IF EXISTS profile_listed_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0008_outbox_email'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            drop_raw_partial_index, migrations.RunPython.noop,
+        ),
+        migrations.RemoveIndex(
+            model_name='profile',
+            name='profile_listed_published_idx',
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(condition=models.Q(('deleted_at', None), ('is_public', True)), fields=['-published_at', '-id'], name='profile_listed_idx'),
+        ),
+    ]
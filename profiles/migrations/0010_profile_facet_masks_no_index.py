@@ -0,0 +1,34 @@
+# Generated by Django 3.2 on 2026-10-18 16:06
+
+from django.db import migrations
+import profiles.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0009_profile_listed_partial_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='profile',
+            name='brain_structure_mask',
+            field=profiles.models.BitmaskField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='profile',
+            name='domains_mask',
+            field=profiles.models.BitmaskField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='profile',
+            name='methods_mask',
+            field=profiles.models.BitmaskField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='profile',
+            name='modalities_mask',
+            field=profiles.models.BitmaskField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,42 @@
+from functools import reduce
+from operator import or_
+
+from django.db import migrations
+from django.db.models import Q
+
+SENIOR = 2
+
+POSITIONS = (
+    'PhD student',
+    'Medical Doctor',
+    'Post-doctoral researcher',
+    'Researcher/ scientist',
+    'Senior researcher/ scientist',
+    'Lecturer',
+    'Assistant Professor',
+    'Associate Professor',
+    'Professor',
+    'Group leader/ Director/ Head of Department',
+)
+
+SENIOR_POSITION_WORDS = ('senior', 'lecturer', 'professor', 'director', 'principal')
+
+
+def populate_senior_positions(apps, schema_editor):
+    Profile = apps.get_model('profiles', 'Profile')
+    Profile.objects.exclude(position__in=POSITIONS).filter(reduce(or_, (
+        Q(position__icontains=word) for word in SENIOR_POSITION_WORDS
+    ))).update(seniority=SENIOR)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0010_profile_facet_masks_no_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            populate_senior_positions, migrations.RunPython.noop,
+        ),
+    ]
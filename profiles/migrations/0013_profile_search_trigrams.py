@@ -0,0 +1,59 @@
+# Generated by Django 3.2 on 2026-10-18 16:28
+
+import re
+
+from django.db import migrations
+
+FTS_TABLE = 'profiles_profile_fts'
+
+WORD_RE = re.compile(r'\w+')
+
+
+def create_fts_table(schema_editor, tokenize):
+    schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+    schema_editor.execute(
+        f'CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5('
+        f'search_document, tokenize={tokenize!r})'
+    )
+    schema_editor.execute(
+        f'INSERT INTO {FTS_TABLE} (rowid, search_document) '
+        f'SELECT id, search_document FROM profiles_profile'
+    )
+
+
+def populate_search_tokens(apps, schema_editor):
+    Profile = apps.get_model('profiles', 'Profile')
+    for profile in Profile.objects.only('search_document').iterator():
+        words = sorted(set(WORD_RE.findall(profile.search_document)))
+        Profile.objects.filter(pk=profile.pk).update(
+            search_tokens=' {} '.format(' '.join(words)),
+        )
+
+
+def use_trigrams(apps, schema_editor):
+    # MySQL keeps its FULLTEXT index, which now only ranks the matches
+    if schema_editor.connection.vendor == 'sqlite':
+        create_fts_table(schema_editor, 'trigram')
+
+
+def use_words(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        create_fts_table(schema_editor, 'unicode61 remove_diacritics 2')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0012_password_reset_request'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            migrations.RunPython.noop, populate_search_tokens,
+        ),
+        migrations.RemoveField(
+            model_name='profile',
+            name='search_tokens',
+        ),
+        migrations.RunPython(use_trigrams, use_words),
+    ]
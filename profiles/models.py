@@ -1,6 +1,14 @@
+import re
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+from types import MappingProxyType
+
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin
 from django.contrib.auth.base_user import BaseUserManager
 from django.db import models
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 from django.db.models.query import QuerySet
 from django.utils import timezone
 
@@ -120,6 +128,41 @@ POSITION_CHOICES = (
 )
 
 
+
+class Seniority(models.IntegerChoices):
+    UNKNOWN = 0, 'Unknown'
+    JUNIOR = 1, 'Junior'
+    SENIOR = 2, 'Senior'
+
+
+# Seniority of the positions, including the ones no longer offered.
+POSITION_SENIORITY = MappingProxyType({
+    PHD: Seniority.JUNIOR,
+    MDR: Seniority.JUNIOR,
+    PDR: Seniority.JUNIOR,
+    JRE: Seniority.JUNIOR,
+    SRE: Seniority.SENIOR,
+    LEC: Seniority.SENIOR,
+    ATP: Seniority.SENIOR,
+    ACP: Seniority.SENIOR,
+    PRF: Seniority.SENIOR,
+    DIR: Seniority.SENIOR,
+})
+
+# Words of the senior positions outside POSITION_SENIORITY, such as
+# 'Principal Investigator' in profiles created before the choices.
+SENIOR_POSITION_WORDS = ('senior', 'lecturer', 'professor', 'director', 'principal')
+
+
+def position_seniority(position):
+    if position in POSITION_SENIORITY:
+        return POSITION_SENIORITY[position]
+    position = (position or '').lower()
+    if any(word in position for word in SENIOR_POSITION_WORDS):
+        return Seniority.SENIOR
+    return Seniority.UNKNOWN
+
+
 PUBLICATION_TYPE = (
     ('peer-reviewed-paper', 'Peer-reviewed Paper'),
     ('report', 'Report'),
@@ -128,6 +171,66 @@ PUBLICATION_TYPE = (
     ('blog-post', 'Blog Post')
 )
 
+FACETS = {
+    'brain_structure': STRUCTURE_CHOICES,
+    'modalities': MODALITIES_CHOICES,
+    'methods': METHODS_CHOICES,
+    'domains': DOMAINS_CHOICES,
+}
+
+# Bit i of a facet mask stands for the i-th choice of the facet, so choices
+# must only ever be appended to keep the stored masks valid.
+FACET_BITS = {
+    facet: {code: 1 << i for i, (code, _) in enumerate(choices)}
+    for facet, choices in FACETS.items()
+}
+
+# Frozen code -> label maps of the choice fields, built once at import.
+LABELS = MappingProxyType({
+    **{
+        facet: MappingProxyType(dict(choices))
+        for facet, choices in FACETS.items()
+    },
+    'grad_month': MappingProxyType(dict(MONTHS_CHOICES)),
+})
+
+
+def _build_label_tokens():
+    index = defaultdict(set)
+    for facet, choices in FACETS.items():
+        for code, label in choices:
+            for word in re.findall(r'\w+', label.lower()):
+                for i in range(len(word)):
+                    for j in range(i + 1, len(word) + 1):
+                        index[word[i:j]].add((facet, code))
+    return MappingProxyType({
+        fragment: frozenset(codes) for fragment, codes in index.items()
+    })
+
+
+# Reverse index from every fragment of a lowercased label word to the
+# (facet, code) pairs whose label contains it, e.g. 'physio' ->
+# {('modalities', 'EP'), ('modalities', 'OE')}.
+LABEL_TOKENS = _build_label_tokens()
+
+
+def choice_codes(value):
+    """Codes of a MultiSelectField value, which is a raw string until saved."""
+    if isinstance(value, str):
+        return [code.strip() for code in value.split(',') if code.strip()]
+    return list(value or ())
+
+
+def facet_mask(facet, codes):
+    bits = FACET_BITS[facet]
+    return reduce(or_, (bits.get(code, 0) for code in choice_codes(codes)), 0)
+
+
+def facet_q(facet, codes, match_all=False):
+    """Profiles having any (or all) of ``codes`` in ``facet``."""
+    lookup = 'hasall' if match_all else 'hasany'
+    return Q(**{f'{facet}_mask__{lookup}': facet_mask(facet, codes)})
+
 
 class EnumField(models.CharField):
 
@@ -151,6 +254,33 @@ class EnumField(models.CharField):
         return self.to_python(value)
 
 
+class BitmaskField(models.PositiveIntegerField):
+    pass
+
+
+@BitmaskField.register_lookup
+class HasAnyBits(models.Lookup):
+    lookup_name = 'hasany'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'({lhs} & {rhs}) != 0', lhs_params + rhs_params
+
+
+@BitmaskField.register_lookup
+class HasAllBits(models.Lookup):
+    lookup_name = 'hasall'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return (
+            f'({lhs} & {rhs}) = {rhs}',
+            lhs_params + rhs_params + rhs_params,
+        )
+
+
 class Country(models.Model):
     code = models.CharField(max_length=3, blank=False, unique=True)
     name = models.CharField(max_length=60, blank=False)
@@ -160,6 +290,13 @@ class Country(models.Model):
         verbose_name_plural = 'countries'
         ordering = ['name']
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # keep the loaded values to detect changes on save
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
     def __str__(self):
         return self.name
 
@@ -205,6 +342,13 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     objects = UserManager()
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # keep the loaded values to detect changes on save
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
     def __str__(self):
         return self.username
 
@@ -232,7 +376,68 @@ class User(AbstractBaseUser, PermissionsMixin):
         return False
 
 
-class ProfileManager(models.Manager):
+class ProfileQuerySet(QuerySet):
+    def delete(self):
+        # no signals are sent, do the work of the profile receivers here
+        from . import cache
+        from .snapshots import schedule_snapshot
+
+        keys = list(
+            self.order_by().values_list('country_id', 'position').distinct()
+        )
+        now = timezone.now()
+        count = super().update(deleted_at=now, updated_at=now)
+        refresh_statistics(
+            {country for country, _ in keys}, {position for _, position in keys},
+        )
+        cache.bump_version('profiles')
+        cache.bump_version('recommendations')
+        schedule_snapshot()
+        return count
+    delete.queryset_only = True
+
+    def hard_delete(self):
+        return super().delete()
+
+    def alive(self):
+        return self.filter(deleted_at=None)
+
+    def dead(self):
+        return self.exclude(deleted_at=None)
+
+    def with_recommendation_count(self):
+        # a subquery rather than a JOIN and GROUP BY, so that the rows can
+        # still be read in the order of an index and stop at the LIMIT
+        Recommendation = self.model._meta.get_field('recommendations').related_model
+        count = Recommendation._base_manager.filter(
+            profile=OuterRef('pk'),
+        ).order_by().values('profile').annotate(count=Count('pk')).values('count')
+        return self.annotate(recommendation_count=Coalesce(Subquery(count), 0))
+
+    def with_latest_recommendation(self):
+        Recommendation = self.model._meta.get_field('recommendations').related_model
+        latest = Recommendation._base_manager.filter(
+            profile=OuterRef('pk'),
+        ).order_by('-updated_at').values('updated_at')[:1]
+        return self.annotate(latest_recommendation=Subquery(latest))
+
+    def with_facet(self, facet, codes, match_all=False):
+        return self.filter(facet_q(facet, codes, match_all))
+
+    def with_brain_structure(self, *codes, match_all=False):
+        return self.with_facet('brain_structure', codes, match_all)
+
+    def with_modalities(self, *codes, match_all=False):
+        return self.with_facet('modalities', codes, match_all)
+
+    def with_methods(self, *codes, match_all=False):
+        return self.with_facet('methods', codes, match_all)
+
+    def with_domains(self, *codes, match_all=False):
+        return self.with_facet('domains', codes, match_all)
+
+
+class ProfileManager(models.Manager.from_queryset(ProfileQuerySet)):
 
     def __init__(self, *args, **kwargs):
         self.alive_only = kwargs.pop('alive_only', True)
@@ -247,20 +452,6 @@ class ProfileManager(models.Manager):
         return self.get_queryset().hard_delete()
 
 
-class ProfileQuerySet(QuerySet):
-    def delete(self):
-        return super().update(deleted_at=timezone.now())
-
-    def hard_delete(self):
-        return super().delete()
-
-    def alive(self):
-        return self.filter(deleted_at=None)
-
-    def dead(self):
-        return self.exclude(deleted_at=None)
-
-
 class Profile(models.Model):
 
     objects = ProfileManager()
@@ -300,8 +491,17 @@ class Profile(models.Model):
                                 on_delete=models.CASCADE,
                                 related_name='profiles',
                                 null=True)
+    # copy of country.is_under_represented, kept in sync by signals
+    country_is_under_represented = models.BooleanField(
+        default=False, db_index=True, editable=False,
+    )
     position = models.CharField(max_length=50, choices=POSITION_CHOICES,
                                 blank=True)
+    # derived from position, see position_seniority
+    seniority = models.PositiveSmallIntegerField(
+        choices=Seniority.choices, default=Seniority.UNKNOWN,
+        db_index=True, editable=False,
+    )
     grad_month = models.CharField(verbose_name='Month', max_length=2,
                                   choices=MONTHS_CHOICES, blank=True)
     grad_year = models.CharField(verbose_name='Year', max_length=4, blank=True)
@@ -311,6 +511,16 @@ class Profile(models.Model):
     domains = MultiSelectField(choices=DOMAINS_CHOICES, blank=True)
     keywords = models.CharField(max_length=250, blank=True)
 
+    # bitmasks of the multi-select fields above, see FACET_BITS; no index
+    # can serve their bitwise lookups, which are cheap tests of the rows
+    # the other filters select
+    brain_structure_mask = BitmaskField(default=0, editable=False)
+    modalities_mask = BitmaskField(default=0, editable=False)
+    methods_mask = BitmaskField(default=0, editable=False)
+    domains_mask = BitmaskField(default=0, editable=False)
+
+    search_document = models.TextField(blank=True, editable=False)
+
     orcid = models.CharField(null=True, blank=True, verbose_name='ORCID', max_length=30, help_text='Please insert the information from the brackets: https://orcid.org/[ID]')
     twitter = models.CharField(null=True, blank=True, max_length=200, help_text='Please insert the information from the brackets: https://twitter.com/[username]')
     linkedin = models.CharField(null=True, blank=True, verbose_name='LinkedIn', max_length=200, help_text='Please insert the information from the brackets: https://linkedin.com/in/[username]')
@@ -332,6 +542,46 @@ class Profile(models.Model):
     class Meta:
         ordering = ['name', 'institution', 'updated_at']
         base_manager_name = 'objects'
+        # shaped after the hot queries, see the explain_queries command
+        indexes = [
+            # repository list and search API, newest first; MySQL has no
+            # partial indexes and builds it on every profile
+            models.Index(
+                fields=['-published_at', '-id'],
+                name='profile_listed_idx',
+                condition=Q(is_public=True, deleted_at=None),
+            ),
+            # sitemap, in the default ordering
+            models.Index(
+                fields=[
+                    'is_public', 'deleted_at', 'name', 'institution',
+                    'updated_at',
+                ],
+                name='profile_listed_name_idx',
+            ),
+            # latest changes of the listed profiles
+            models.Index(
+                fields=['is_public', 'deleted_at', 'updated_at'],
+                name='profile_listed_updated_idx',
+            ),
+            # positions of the alive profiles, for the position statistics
+            models.Index(
+                fields=['position', 'deleted_at'],
+                name='profile_position_alive_idx',
+            ),
+            # unclaimed profile matching a newly confirmed account
+            models.Index(
+                fields=['contact_email', 'user'],
+                name='profile_contact_email_idx',
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # keep the loaded values to detect changes on save
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
 
     def delete(self):
         self.deleted_at = timezone.now()
@@ -343,24 +593,34 @@ class Profile(models.Model):
     def __str__(self):
         return f'{self.name}, {self.institution}'
 
+    def update_facet_masks(self):
+        for facet in FACETS:
+            setattr(self, f'{facet}_mask', facet_mask(facet, getattr(self, facet)))
+
+    def update_list_filters(self):
+        self.seniority = position_seniority(self.position)
+        self.country_is_under_represented = bool(
+            self.country_id and self.country.is_under_represented
+        )
+
+    def facet_labels(self, facet):
+        labels = LABELS[facet]
+        return [labels.get(code, code) for code in choice_codes(getattr(self, facet))]
+
     def brain_structure_labels(self):
-        return [dict(STRUCTURE_CHOICES).get(item, item)
-                for item in self.brain_structure]
+        return self.facet_labels('brain_structure')
 
     def modalities_labels(self):
-        return [dict(MODALITIES_CHOICES).get(item, item)
-                for item in self.modalities]
+        return self.facet_labels('modalities')
 
     def methods_labels(self):
-        return [dict(METHODS_CHOICES).get(item, item)
-                for item in self.methods]
+        return self.facet_labels('methods')
 
     def domains_labels(self):
-        return [dict(DOMAINS_CHOICES).get(item, item)
-                for item in self.domains]
+        return self.facet_labels('domains')
 
     def grad_month_labels(self):
-        return dict(MONTHS_CHOICES).get(self.grad_month)
+        return LABELS['grad_month'].get(self.grad_month)
 
     def get_absolute_url(self):
         if self.user:
@@ -368,6 +628,77 @@ class Profile(models.Model):
         return reverse('profiles:detail', args=[self.pk])
 
 
+class ProfileStatistic(models.Model):
+    """
+    Number of listed profiles by ``key``. Kept up to date by the profile
+    signals, rebuilt by the rebuild_profile_statistics command.
+    """
+    key = None
+
+    profiles_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def counts(cls, **filters):
+        """(key, count) of the listed profiles matching ``filters``."""
+        return Profile.objects.filter(
+            is_public=True, **{f'{cls.key}__isnull': False}, **filters,
+        ).order_by().values(cls.key).annotate(
+            count=Count('pk'),
+        ).values_list(cls.key, 'count')
+
+    @classmethod
+    def refresh(cls, keys):
+        """Recounts the profiles of ``keys``, whatever else changed meanwhile."""
+        keys = set(keys) - {None}
+        if not keys:
+            return
+        counts = dict(cls.counts(**{f'{cls.key}__in': keys}))
+        for key in keys:
+            if counts.get(key):
+                cls.objects.update_or_create(
+                    **{cls.key: key}, defaults={'profiles_count': counts[key]},
+                )
+            else:
+                cls.objects.filter(**{cls.key: key}).delete()
+
+    @classmethod
+    def rebuild(cls):
+        cls.objects.all().delete()
+        return len(cls.objects.bulk_create(
+            cls(**{cls.key: key}, profiles_count=count)
+            for key, count in cls.counts()
+        ))
+
+
+class CountryStatistic(ProfileStatistic):
+    """Listed profiles of a country, for the home page map."""
+    key = 'country_id'
+
+    country = models.OneToOneField(
+        Country,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='statistic',
+    )
+
+
+class PositionStatistic(ProfileStatistic):
+    """Listed profiles of a position, for the home page charts."""
+    key = 'position'
+
+    position = models.CharField(
+        max_length=50, choices=POSITION_CHOICES, primary_key=True,
+    )
+
+
+def refresh_statistics(countries=(), positions=()):
+    CountryStatistic.refresh(countries)
+    PositionStatistic.refresh(positions)
+
+
 class RecommendationQuerySet(QuerySet):
     pass
 
@@ -450,3 +781,62 @@ class Publication(models.Model):
 
     class Meta:
         ordering = ['-published_at']
+
+
+class OutboxEmailQuerySet(QuerySet):
+    def pending(self, now=None):
+        """E-mails left to send, due at ``now``, the oldest first."""
+        return self.filter(
+            sent_at=None, failed_at=None, send_after__lte=now or timezone.now(),
+        ).order_by('send_after', 'pk')
+
+
+class OutboxEmail(models.Model):
+    """An e-mail waiting for the send_outbox command, see profiles.emails."""
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=255)
+    to = models.JSONField(default=list)
+    headers = models.JSONField(default=dict)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    send_after = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    failed_at = models.DateTimeField(null=True, blank=True)
+
+    objects = OutboxEmailQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # pending e-mails, in the order they are sent
+            models.Index(
+                fields=['sent_at', 'failed_at', 'send_after'],
+                name='outbox_pending_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.subject} to {", ".join(self.to)}'
+
+
+class PasswordResetRequest(models.Model):
+    """
+    A password reset asked for an address, whether it has an account or
+    not: the send_outbox command looks the account up and queues its e-mail.
+    """
+
+    email = models.EmailField()
+    # the scheme and host of the request, for the links of the e-mail
+    base_url = models.URLField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['created_at', 'pk']
+
+    def __str__(self):
+        return self.email
@@ -0,0 +1,101 @@
+from django.core import signing
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.http import Http404
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+from . import cache
+
+
+def published_after(published_at, pk):
+    """Rows after ``(published_at, pk)`` in the ``-published_at, -id`` order."""
+    return (
+        Q(published_at__lt=published_at)
+        | Q(published_at=published_at, pk__lt=pk)
+    )
+
+
+def cached_count(queryset, count_key):
+    """``queryset.count()``, cached under ``count_key`` when given."""
+    if count_key is None:
+        return queryset.count()
+    return cache.get_or_set('profiles', ('count', count_key), queryset.count)
+
+
+class CachedCountPaginator(Paginator):
+    def __init__(self, *args, count_key=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.count_key = count_key
+
+    @cached_property
+    def count(self):
+        return cached_count(self.object_list, self.count_key)
+
+
+class CursorPage:
+    def __init__(self, object_list, paginator, next_cursor):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+class CursorPaginator:
+    """
+    Keyset pagination over a queryset browsed by ``-published_at, -id``.
+
+    Each page starts after the last row of the previous one, so reading page
+    N costs the same as reading the first page. The cursor is signed and
+    carries the total count, which is therefore only computed once.
+    """
+    salt = 'profiles.pagination.CursorPaginator'
+
+    def __init__(self, object_list, per_page, count_key=None):
+        self.object_list = object_list.order_by('-published_at', '-id')
+        self.per_page = per_page
+        self.count_key = count_key
+        self.count = None
+
+    def encode_cursor(self, obj):
+        return signing.dumps({
+            'p': obj.published_at.isoformat(),
+            'i': obj.pk,
+            'n': self.count,
+        }, salt=self.salt, compress=True)
+
+    def decode_cursor(self, cursor):
+        try:
+            data = signing.loads(cursor, salt=self.salt)
+            return parse_datetime(data['p']), int(data['i']), int(data['n'])
+        except (signing.BadSignature, KeyError, TypeError, ValueError):
+            raise Http404('Invalid cursor.')
+
+    def page(self, cursor=None):
+        object_list = self.object_list
+        if cursor:
+            published_at, pk, self.count = self.decode_cursor(cursor)
+            object_list = object_list.filter(published_after(published_at, pk))
+
+        # one extra row tells whether there is a next page
+        rows = list(object_list[:self.per_page + 1])
+        has_next = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if not cursor:
+            # a single page needs no COUNT query
+            self.count = (
+                cached_count(object_list, self.count_key)
+                if has_next else len(rows)
+            )
+
+        next_cursor = self.encode_cursor(rows[-1]) if has_next else None
+        return CursorPage(rows, self, next_cursor)
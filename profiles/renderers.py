@@ -0,0 +1,7 @@
+from rest_framework.renderers import JSONRenderer
+
+
+class ColumnarJSONRenderer(JSONRenderer):
+    """JSON of ``ProfileColumnarSerializer``, chosen with ``?format=columnar``."""
+    media_type = 'application/vnd.winrepo.columnar+json'
+    format = 'columnar'
@@ -0,0 +1,279 @@
+"""
+Profile search engine.
+
+Every profile carries a denormalized, lowercased and accent-folded
+``search_document`` (name, institution, position, country, keywords and the
+labels of its research fields). Each term of a search must be contained in
+it, anywhere, like the ``icontains`` matching this replaced: 'imaging' finds
+'Neuroimaging'. The backend is chosen from ``settings.SEARCH_BACKEND``:
+
+- SQLite: an FTS5 table with the trigram tokenizer answers the terms of three
+  characters or more from its index, and ranks with bm25.
+- MySQL: InnoDB full-text search only matches word prefixes, and its ngram
+  parser drops the ngrams holding a stopword, so the terms are matched row
+  by row; the FULLTEXT index only ranks the matches.
+- elsewhere: a row by row substring match, unranked.
+"""
+import re
+import unicodedata
+from functools import lru_cache, reduce
+from operator import and_
+from types import MappingProxyType
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce
+from django.utils.module_loading import import_string
+
+from .models import (
+    FACETS,
+    LABEL_TOKENS,
+    LABELS,
+    Profile,
+    Publication,
+    choice_codes,
+)
+
+FTS_TABLE = 'profiles_profile_fts'
+
+WORD_RE = re.compile(r'\w+')
+
+
+def normalize(text):
+    """Lowercase ``text`` and strip its accents, e.g. 'Zürich' -> 'zurich'."""
+    text = unicodedata.normalize('NFKD', text or '')
+    return ''.join(c for c in text if not unicodedata.combining(c)).lower()
+
+
+def split_terms(s):
+    """Split a search string into terms, ignoring successive spaces."""
+    return list(filter(None, (s or '').split(' ')))
+
+
+def build_search_document(profile):
+    """Text indexed for ``profile``."""
+    parts = [
+        profile.name,
+        profile.institution,
+        profile.position,
+        profile.country.name if profile.country_id else '',
+        profile.keywords,
+    ]
+    for facet in FACETS:
+        labels = LABELS[facet]
+        parts += [
+            labels.get(code, code)
+            for code in choice_codes(getattr(profile, facet))
+        ]
+    return normalize(' '.join(filter(None, parts)))
+
+
+def rebuild_search_documents(queryset, chunk_size=500):
+    """
+    Recompute the search columns of ``queryset`` in chunks of ``chunk_size``
+    profiles, without touching ``updated_at``. Returns the number of
+    profiles processed.
+    """
+    backend = get_backend()
+    last_pk = 0
+    count = 0
+    while True:
+        chunk = list(
+            queryset.filter(pk__gt=last_pk)
+            .select_related('country')
+            .order_by('pk')[:chunk_size]
+        )
+        if not chunk:
+            return count
+
+        for profile in chunk:
+            profile.search_document = build_search_document(profile)
+        queryset.bulk_update(chunk, ['search_document'])
+        for profile in chunk:
+            backend.index(profile)
+
+        last_pk = chunk[-1].pk
+        count += len(chunk)
+
+
+class ChoiceResolver:
+    """
+    Resolves a search term to the codes of the choices whose label contains
+    it, as ``{field: (code, ...)}``. Labels are normalized once and recent
+    terms are cached, so no pattern is ever compiled from user input.
+
+    ``tokens`` is an optional index from every fragment of a label word to
+    its ``(field, code)`` pairs (see ``LABEL_TOKENS``), answering terms made
+    of word characters only with a single lookup.
+    """
+
+    def __init__(self, choices, tokens=None):
+        self.labels = tuple(
+            (field, code, normalize(label))
+            for field, field_choices in choices.items()
+            for code, label in field_choices
+        )
+        self.tokens = tokens
+        self.resolve = lru_cache(maxsize=1024)(self._resolve)
+
+    def _resolve(self, term):
+        term = normalize(term)
+        if self.tokens is not None and WORD_RE.fullmatch(term):
+            matches = self.tokens.get(term, ())
+        else:
+            matches = (
+                (field, code)
+                for field, code, label in self.labels
+                if term in label
+            )
+
+        codes = {}
+        for field, code in matches:
+            codes.setdefault(field, []).append(code)
+        return MappingProxyType({
+            field: tuple(field_codes) for field, field_codes in codes.items()
+        })
+
+
+FACET_RESOLVER = ChoiceResolver(FACETS, tokens=LABEL_TOKENS)
+
+PUBLICATION_TYPE_RESOLVER = ChoiceResolver({
+    'type': Publication.Type.choices,
+})
+
+
+class BasicSearchBackend:
+    """Portable fallback matching each term as a substring of the document."""
+
+    def term_filter(self, term):
+        """Profiles whose document contains ``term``."""
+        return Q(search_document__contains=normalize(term))
+
+    def annotate_rank(self, queryset, terms):
+        return queryset.annotate(
+            search_rank=Value(0.0, output_field=FloatField()),
+        )
+
+    def search(self, queryset, terms):
+        for term in terms:
+            queryset = queryset.filter(self.term_filter(term))
+        return self.annotate_rank(queryset, terms)
+
+    def index(self, profile):
+        pass
+
+    def remove(self, profile):
+        pass
+
+
+class SQLiteFTS5Backend(BasicSearchBackend):
+    """
+    Matches terms as substrings against an FTS5 trigram table keyed by
+    profile id, ranked with bm25. Terms shorter than a trigram are matched
+    row by row. The table is kept in sync by ``index``/``remove``.
+    """
+    min_term_size = 3
+
+    def match_expression(self, term):
+        term = normalize(term)
+        if len(term) < self.min_term_size:
+            return None
+        return '"' + term.replace('"', '""') + '"'
+
+    def term_filter(self, term):
+        expression = self.match_expression(term)
+        if expression is None:
+            return super().term_filter(term)
+        return Q(pk__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+            [expression],
+        ))
+
+    def annotate_rank(self, queryset, terms):
+        expressions = list(filter(None, map(self.match_expression, terms)))
+        if not expressions:
+            return super().annotate_rank(queryset, terms)
+
+        table = queryset.model._meta.db_table
+        rank = RawSQL(
+            f'SELECT -bm25({FTS_TABLE}) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = "{table}"."id"',
+            [' OR '.join(expressions)],
+            output_field=FloatField(),
+        )
+        return queryset.annotate(search_rank=Coalesce(rank, 0.0))
+
+    def index(self, profile):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [profile.pk],
+            )
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, search_document) '
+                f'VALUES (%s, %s)',
+                [profile.pk, profile.search_document],
+            )
+
+    def remove(self, profile):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [profile.pk],
+            )
+
+
+class MySQLFullTextBackend(BasicSearchBackend):
+    """
+    Substring matching ranked by a boolean-mode MATCH against the FULLTEXT
+    index on ``search_document``.
+
+    InnoDB does not index words shorter than ``innodb_ft_min_token_size``
+    nor its default stopwords, so these words do not count in the rank.
+    """
+    min_token_size = 3
+    stopwords = frozenset((
+        'a', 'about', 'an', 'are', 'as', 'at', 'be', 'by', 'com', 'de', 'en',
+        'for', 'from', 'how', 'i', 'in', 'is', 'it', 'la', 'of', 'on', 'or',
+        'that', 'the', 'this', 'to', 'was', 'what', 'when', 'where', 'who',
+        'will', 'with', 'und', 'www',
+    ))
+
+    def words(self, term):
+        words = WORD_RE.findall(normalize(term))
+        if not words or any(
+            len(w) < self.min_token_size or w in self.stopwords
+            for w in words
+        ):
+            return None
+        return words
+
+    def annotate_rank(self, queryset, terms):
+        words = [
+            w for t in terms for w in (self.words(t) or ())
+        ]
+        if not words:
+            return super().annotate_rank(queryset, terms)
+
+        table = queryset.model._meta.db_table
+        rank = RawSQL(
+            f'MATCH (`{table}`.`search_document`) '
+            f'AGAINST (%s IN BOOLEAN MODE)',
+            [' '.join(f'{w}*' for w in words)],
+            output_field=FloatField(),
+        )
+        return queryset.annotate(search_rank=rank)
+
+
+@lru_cache(maxsize=None)
+def _load_backend(path, vendor):
+    if not path:
+        path = {
+            'mysql': 'profiles.search.MySQLFullTextBackend',
+            'sqlite': 'profiles.search.SQLiteFTS5Backend',
+        }.get(vendor, 'profiles.search.BasicSearchBackend')
+    return import_string(path)()
+
+
+def get_backend():
+    return _load_backend(settings.SEARCH_BACKEND, connection.vendor)
@@ -1,7 +1,7 @@
 
 from rest_framework import serializers
 
-from .models import Profile, Country
+from .models import LABELS, Country, Profile, choice_codes
 
 
 class CountrySerializer(serializers.ModelSerializer):
@@ -18,11 +18,19 @@ class ProfileSerializer(serializers.ModelSerializer):
         fields = ('id', 'name')
 
 
-class ProfileSearchSerializer(serializers.ModelSerializer):
+class DynamicFieldsMixin:
+    """Takes an optional ``fields`` argument restricting the output fields."""
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class ProfileSearchSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     country_name = serializers.CharField(source='country.name', default='')
-    country_is_under_represented = serializers.BooleanField(
-        source='country.is_under_represented', default=False,
-    )
     username = serializers.CharField(source='user.username', default=None)
     recommendation_count = serializers.IntegerField(read_only=True)
     modalities_display = serializers.SerializerMethodField()
@@ -44,6 +52,73 @@ class ProfileSearchSerializer(serializers.ModelSerializer):
         return ', '.join(obj.domains_labels()) if obj.domains else ''
 
 
+class ProfileColumnarSerializer:
+    """
+    Columnar form of ``ProfileSearchSerializer``: the field names once, then a
+    row of values per profile. Repeated strings are dictionary encoded, the
+    rows hold their index in ``dictionaries`` (a list of indexes for the
+    modalities and domains).
+    """
+
+    # field: (queryset column, encoding)
+    columns = {
+        'id': ('id', None),
+        'name': ('name', None),
+        'position': ('position', 'value'),
+        'institution': ('institution', 'value'),
+        'country_name': ('country__name', 'value'),
+        'country_is_under_represented': ('country_is_under_represented', None),
+        'modalities_display': ('modalities', 'modalities'),
+        'domains_display': ('domains', 'domains'),
+        'keywords': ('keywords', None),
+        'username': ('user__username', None),
+        'recommendation_count': ('recommendation_count', None),
+    }
+
+    def __init__(self, queryset, fields=None):
+        self.queryset = queryset
+        self.fields = [
+            name for name in self.columns if fields is None or name in fields
+        ]
+
+    @property
+    def data(self):
+        dictionaries = {
+            name: {} for name in self.fields if self.columns[name][1]
+        }
+
+        def encode(name, value):
+            return dictionaries[name].setdefault(value, len(dictionaries[name]))
+
+        rows = []
+        values = self.queryset.values_list(
+            *(self.columns[name][0] for name in self.fields)
+        )
+        for profile in values:
+            row = []
+            for name, value in zip(self.fields, profile):
+                encoding = self.columns[name][1]
+                if encoding is None:
+                    row.append(value)
+                elif encoding == 'value':
+                    row.append(encode(name, value or ''))
+                else:
+                    labels = LABELS[encoding]
+                    row.append([
+                        encode(name, labels.get(code, code))
+                        for code in choice_codes(value)
+                    ])
+            rows.append(row)
+
+        return {
+            'fields': self.fields,
+            'dictionaries': {
+                name: list(values) for name, values in dictionaries.items()
+            },
+            'rows': rows,
+        }
+
+
 class PositionsCountSerializer(serializers.ModelSerializer):
     profiles_count = serializers.IntegerField()
 
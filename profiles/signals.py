@@ -1,9 +1,153 @@
 from datetime import datetime, timedelta
 from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import cache
+from .models import (
+    Country,
+    Profile,
+    Publication,
+    Recommendation,
+    User,
+    refresh_statistics,
+)
+from .search import (
+    build_search_document,
+    get_backend,
+    rebuild_search_documents,
+)
+from .snapshots import schedule_snapshot
 
 def detect_first_login(sender, user, request, **kwargs):
     if user.last_login is None:
         request.session['first_login'] = True
 
 user_logged_in.connect(detect_first_login)
-user_logged_in.receivers = user_logged_in.receivers[-1:] + user_logged_in.receivers[:-1] 
+user_logged_in.receivers = user_logged_in.receivers[-1:] + user_logged_in.receivers[:-1]
+
+
+@receiver(pre_save, sender=Profile)
+def update_facet_masks(sender, instance, **kwargs):
+    instance.update_facet_masks()
+
+
+@receiver(pre_save, sender=Profile)
+def update_list_filters(sender, instance, **kwargs):
+    instance.update_list_filters()
+
+
+@receiver(pre_save, sender=Profile)
+def update_search_document(sender, instance, **kwargs):
+    instance.search_document = build_search_document(instance)
+
+
+@receiver(post_save, sender=Profile)
+def index_profile(sender, instance, **kwargs):
+    get_backend().index(instance)
+
+
+@receiver(post_delete, sender=Profile)
+def unindex_profile(sender, instance, **kwargs):
+    get_backend().remove(instance)
+
+
+# the fields deciding where a profile is counted, see ProfileStatistic
+STATISTICS_FIELDS = ('country_id', 'position', 'is_public', 'deleted_at')
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def update_profile_statistics(sender, instance, signal, **kwargs):
+    loaded_values = getattr(instance, '_loaded_values', {})
+    values = {field: getattr(instance, field) for field in STATISTICS_FIELDS}
+    if signal is post_save and loaded_values and all(
+        loaded_values.get(field) == value for field, value in values.items()
+    ):
+        return
+    refresh_statistics(
+        {loaded_values.get('country_id'), instance.country_id},
+        {loaded_values.get('position'), instance.position},
+    )
+    instance._loaded_values = {**loaded_values, **values}
+
+
+@receiver(post_save, sender=Country)
+def update_country_search_documents(sender, instance, created, **kwargs):
+    loaded_values = getattr(instance, '_loaded_values', {})
+    if created or loaded_values.get('name') == instance.name:
+        return
+    profiles = Profile.all_objects.filter(country=instance)
+    rebuild_search_documents(profiles)
+    # their country name changed for the API clients too
+    profiles.update(updated_at=timezone.now())
+    loaded_values['name'] = instance.name
+
+
+@receiver(post_save, sender=Country)
+def update_country_profiles(sender, instance, created, **kwargs):
+    loaded_values = getattr(instance, '_loaded_values', {})
+    if created or (
+        loaded_values.get('is_under_represented')
+        == instance.is_under_represented
+    ):
+        return
+    Profile.all_objects.filter(country=instance).update(
+        country_is_under_represented=instance.is_under_represented,
+        updated_at=timezone.now(),
+    )
+    loaded_values['is_under_represented'] = instance.is_under_represented
+
+
+@receiver(post_save, sender=User)
+def update_user_profile(sender, instance, created, **kwargs):
+    loaded_values = getattr(instance, '_loaded_values', {})
+    if created or loaded_values.get('username') == instance.username:
+        return
+    # the username is in the links of the pages and in the API rows, and no
+    # profile signal is sent
+    Profile.all_objects.filter(user=instance).update(updated_at=timezone.now())
+    cache.bump_version('profiles')
+    cache.bump_version('recommendations')
+    schedule_snapshot()
+    loaded_values['username'] = instance.username
+
+
+@receiver(post_save, sender=Recommendation)
+@receiver(post_delete, sender=Recommendation)
+def touch_recommended_profile(sender, instance, **kwargs):
+    # the recommendation count is part of the profile for the API clients
+    Profile.all_objects.filter(pk=instance.profile_id).update(
+        updated_at=timezone.now(),
+    )
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+@receiver(post_save, sender=Country)
+def invalidate_profile_counts(sender, **kwargs):
+    cache.bump_version('profiles')
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+@receiver(post_save, sender=Recommendation)
+@receiver(post_delete, sender=Recommendation)
+def invalidate_recent_recommendations(sender, **kwargs):
+    cache.bump_version('recommendations')
+
+
+@receiver(post_save, sender=Publication)
+@receiver(post_delete, sender=Publication)
+def invalidate_publications(sender, **kwargs):
+    cache.bump_version('publications')
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+@receiver(post_save, sender=Recommendation)
+@receiver(post_delete, sender=Recommendation)
+@receiver(post_save, sender=Country)
+def rebuild_search_snapshot(sender, **kwargs):
+    schedule_snapshot()
@@ -0,0 +1,182 @@
+"""
+Prebuilt snapshots of the search API dataset.
+
+The JSON answer of ``/api/profiles/`` is written to disk, gzip and brotli
+compressed, under the version of the dataset it was built from. The API then
+serves the file matching the current version and rebuilds the snapshots in
+the background, at most once every ``PROFILES_SNAPSHOT_DELAY`` seconds,
+after changes.
+"""
+import gzip
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Max
+from rest_framework.renderers import JSONRenderer
+
+from .models import Profile, Recommendation
+from .serializers import ProfileSearchSerializer
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+PREFIX = 'profiles-'
+
+
+def search_dataset():
+    """Profiles served by the search API."""
+    return Profile.objects.filter(
+        is_public=True,
+    ).select_related('country', 'user').with_recommendation_count(
+    ).order_by('-published_at', '-id')
+
+
+def dataset_version():
+    """
+    Fingerprint of the search dataset, which changes whenever a listed
+    profile or a recommendation does (a username change touches the profile,
+    see signals).
+    """
+    profiles = Profile.objects.filter(is_public=True).aggregate(
+        latest=Max('updated_at'), count=Count('pk'),
+    )
+    recommendations = Recommendation.objects.aggregate(
+        latest=Max('pk'), count=Count('pk'),
+    )
+    fingerprint = (
+        profiles['latest'], profiles['count'],
+        recommendations['latest'], recommendations['count'],
+    )
+    return hashlib.md5(repr(fingerprint).encode()).hexdigest()
+
+
+def compressors():
+    yield 'gzip', '.gz', lambda content: gzip.compress(content, 9, mtime=0)
+    if brotli is not None:
+        yield 'br', '.br', lambda content: brotli.compress(content)
+
+
+def snapshot_path(version, suffix):
+    return os.path.join(
+        settings.PROFILES_SNAPSHOT_DIR, f'{PREFIX}{version}.json{suffix}',
+    )
+
+
+def accepted_encodings(accept_encoding):
+    """{coding: q-value} of an Accept-Encoding header."""
+    encodings = {}
+    for coding in accept_encoding.split(','):
+        coding, *params = coding.split(';')
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding.strip():
+            encodings[coding.strip().lower()] = q
+    return encodings
+
+
+def snapshot_exists(version):
+    """Whether the snapshots of ``version`` are built, whoever accepts them."""
+    return bool(settings.PROFILES_SNAPSHOT_DIR) and all(
+        os.path.exists(snapshot_path(version, suffix))
+        for _, suffix, _ in compressors()
+    )
+
+
+def find_snapshot(version, accept_encoding):
+    """(path, encoding) of the best snapshot of ``version`` the client accepts."""
+    if not settings.PROFILES_SNAPSHOT_DIR:
+        return None
+    accepted = accepted_encodings(accept_encoding)
+    best = None
+    # brotli first on ties, it is the smallest
+    for encoding, suffix, _ in reversed(list(compressors())):
+        q = accepted.get(encoding, accepted.get('*', 0))
+        path = snapshot_path(version, suffix)
+        if q > 0 and (best is None or q > best[0]) and os.path.exists(path):
+            best = q, path, encoding
+    return best and best[1:]
+
+
+def write_snapshot(content, version):
+    directory = settings.PROFILES_SNAPSHOT_DIR
+    os.makedirs(directory, exist_ok=True)
+
+    paths = set()
+    for _, suffix, compress in compressors():
+        path = snapshot_path(version, suffix)
+        # readers only ever see complete files
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(compress(content))
+        os.replace(tmp_path, path)
+        paths.add(path)
+
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if name.startswith(PREFIX) and path not in paths:
+            os.remove(path)
+
+
+def build_snapshot():
+    """Writes the snapshots of the current dataset and returns its version."""
+    with transaction.atomic():
+        version = dataset_version()
+        data = ProfileSearchSerializer(search_dataset(), many=True).data
+    write_snapshot(JSONRenderer().render(data), version)
+    return version
+
+
+class Debouncer:
+    """
+    Calls ``func`` in a thread ``delay`` seconds after the first call of a
+    burst, so at most once every ``delay`` seconds.
+    """
+
+    def __init__(self, func, delay):
+        self.func = func
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.timer = None
+
+    def __call__(self):
+        with self.lock:
+            if self.timer is not None:
+                return
+            self.timer = threading.Timer(self.delay, self.run)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def run(self):
+        with self.lock:
+            self.timer = None
+        try:
+            self.func()
+        except Exception:
+            logger.exception('Failed to run %s', self.func.__name__)
+        finally:
+            # the thread has its own database connection
+            connection.close()
+
+
+rebuild_snapshot = Debouncer(build_snapshot, settings.PROFILES_SNAPSHOT_DELAY)
+
+
+def schedule_snapshot():
+    """Rebuilds the snapshots once the current transaction is committed."""
+    if settings.PROFILES_SNAPSHOT_DIR:
+        transaction.on_commit(rebuild_snapshot)
@@ -2,6 +2,7 @@
   'use strict';
 
   var SENIOR_KEYWORDS = ['senior', 'lecturer', 'professor', 'director', 'principal'];
+  var STORAGE_KEY = 'winrepo-profiles';
   var profiles = [];
   var searchInput, urCheckbox, seniorCheckbox, resultsContainer, countEl;
 
@@ -14,8 +15,7 @@
 
     if (!searchInput || !resultsContainer) return;
 
-    fetch('/api/profiles/?format=json')
-      .then(function (r) { return r.json(); })
+    loadProfiles()
       .then(function (data) {
         profiles = data.map(function (p) {
           // pre-compute a searchable text blob per profile (lowercase)
@@ -48,6 +48,64 @@
     }
   }
 
+  // The dataset is kept in localStorage with the token of its version, so
+  // that returning visitors only download what changed since.
+  function loadProfiles() {
+    var stored = readStored();
+    var url = '/api/profiles/changes/?format=json';
+    if (stored) url += '&since=' + encodeURIComponent(stored.token);
+
+    return fetchJson(url).then(function (changes) {
+      if (stored && !changes.reset) {
+        var merged = mergeChanges(stored.profiles, changes);
+        // a profile vanished without notice, start over
+        if (merged.length === changes.count) {
+          return store(changes.token, merged);
+        }
+      }
+      return fetchJson('/api/profiles/?format=json').then(function (data) {
+        return store(changes.token, data);
+      });
+    });
+  }
+
+  function mergeChanges(list, changes) {
+    var changed = {};
+    var removed = {};
+    var known = {};
+    changes.changed.forEach(function (p) { changed[p.id] = p; });
+    changes.removed.forEach(function (id) { removed[id] = true; });
+    list.forEach(function (p) { known[p.id] = true; });
+
+    // new profiles are the most recently published, they come first
+    var merged = changes.changed.filter(function (p) { return !known[p.id]; });
+    list.forEach(function (p) {
+      if (!removed[p.id]) merged.push(changed[p.id] || p);
+    });
+    return merged;
+  }
+
+  function fetchJson(url) {
+    return fetch(url).then(function (r) { return r.json(); });
+  }
+
+  function readStored() {
+    try {
+      return JSON.parse(localStorage.getItem(STORAGE_KEY));
+    } catch (e) {
+      return null;
+    }
+  }
+
+  function store(token, data) {
+    try {
+      localStorage.setItem(STORAGE_KEY, JSON.stringify({ token: token, profiles: data }));
+    } catch (e) {
+      // storage full or disabled, the next visit loads everything again
+    }
+    return data;
+  }
+
   function applyFilter() {
     var query = searchInput.value.trim().toLowerCase();
     var terms = query ? query.split(/\s+/) : [];
@@ -1,10 +1,16 @@
+from types import MappingProxyType
+
 from django import template
-from django.template.loader_tags import BlockNode, IncludeNode, construct_relative_path
+from django.template.loader_tags import (
+    BLOCK_CONTEXT_KEY,
+    BlockContext,
+    BlockNode,
+    IncludeNode,
+    construct_relative_path,
+)
 
 register = template.Library()
 
-BLOCK_CONTEXT_KEY = 'block_context'
-
 
 def get_blocks(nodelist):
     for nl in nodelist:
@@ -56,19 +62,23 @@ def blockinclude(parser, token):
     nodelist = parser.parse(('endblockinclude',))
     parser.delete_first_token()
 
-    blocks_renaming = {}
+    # the blocks of the body are renamed in the including template, where
+    # they only have to be unique; the included template gets them under
+    # their own name
+    blocks = {}
 
     for nl in get_blocks(nodelist):
         if nl.name in parser.__loaded_blocks:
             parser.__loaded_blocks.remove(nl.name)
 
+        blocks[nl.name] = BlockNode(nl.name, nl.nodelist)
+
         idx = 1
         name = nl.name + '_' + str(idx)
         while name in parser.__loaded_blocks:
             idx += 1
             name = nl.name + '_' + str(idx)
 
-        blocks_renaming[nl.name] = name
         nl.name = name
 
         parser.__loaded_blocks.append(nl.name)
@@ -77,14 +87,14 @@ def blockinclude(parser, token):
         nodelist, filter_compile,
         extra_context=namemap,
         isolated_context=isolated_context,
-        blocks_renaming=blocks_renaming
+        blocks=MappingProxyType(blocks),
     )
 
 class BlockIncludeNode(IncludeNode):
 
     def __init__(self, nodelist, *args, **kwargs):
         self.nodelist = nodelist
-        self.blocks_renaming = kwargs.pop('blocks_renaming', {})
+        self.blocks = kwargs.pop('blocks', MappingProxyType({}))
         super().__init__(*args, **kwargs)
 
     def __repr__(self):
@@ -95,6 +105,10 @@ class BlockIncludeNode(IncludeNode):
         Render the specified template and context. Cache the template object
         in render_context to avoid reparsing and loading when used in a for
         loop.
+
+        The blocks of the body override the ones of the included template
+        through a block context of this rendering only, the nodes shared by
+        the threads are never modified.
         """
         template = self.template.resolve(context)
         if not callable(getattr(template, 'render', None)):
@@ -111,29 +125,16 @@ class BlockIncludeNode(IncludeNode):
         elif hasattr(template, 'template'):
             template = template.template
 
-        for nl in get_blocks(template.nodelist):
-            if not isinstance(nl, BlockNode):
-                continue
-            if nl.name in self.blocks_renaming:
-                nl.name = self.blocks_renaming[nl.name]
+        block_context = BlockContext()
+        block_context.add_blocks(self.blocks)
 
         values = {
             name: var.resolve(context)
             for name, var in self.extra_context.items()
         }
-        if self.isolated_context:
-            context = context.new(values)
-        else:
-            context.update(values)
-
-        with context.render_context.push_state(template, isolated_context=False):
-            rendering = template._render(context)
-
-        rev_blocks_renaming = {v: k for k, v in self.blocks_renaming.items()}
-        for nl in get_blocks(template.nodelist):
-            if not isinstance(nl, BlockNode):
-                continue
-            if nl.name in rev_blocks_renaming:
-                nl.name = rev_blocks_renaming[nl.name]
-
-        return rendering
+        with context.render_context.push_state(template):
+            context.render_context[BLOCK_CONTEXT_KEY] = block_context
+            if self.isolated_context:
+                return template._render(context.new(values))
+            with context.push(**values):
+                return template._render(context)
@@ -5,7 +5,13 @@ from django.core import mail
 from django.test import TestCase
 from django.urls import reverse
 
-from profiles.models import Profile, Recommendation, User
+from profiles.models import (
+    OutboxEmail,
+    PasswordResetRequest,
+    Profile,
+    Recommendation,
+    User,
+)
 
 
 class AccountTests(TestCase):
@@ -252,3 +258,25 @@ class AccountTests(TestCase):
         self.assertEqual(response.status_code, HTTPStatus.FOUND)
         self.assertEqual(response.url, reverse('profiles:user'))
 
+    def test_password_reset(self):
+
+        User.objects.create(email='test@test.com', is_active=True)
+
+        for email in ('test@test.com', 'unknown@test.com'):
+            with self.assertNumQueries(1):
+                response = self.client.post(reverse('profiles:forgot'), {
+                    'email': email,
+                })
+            self.assertEqual(response.status_code, HTTPStatus.FOUND)
+            self.assertEqual(response.url, reverse('profiles:forgot'))
+
+        # only the addresses are queued, the accounts are looked up later
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertFalse(OutboxEmail.objects.exists())
+        self.assertEqual(
+            list(PasswordResetRequest.objects.values_list('email', 'base_url')),
+            [
+                ('test@test.com', 'http://testserver/'),
+                ('unknown@test.com', 'http://testserver/'),
+            ],
+        )
@@ -1,7 +1,7 @@
 from django.test import TestCase, Client
 from django.urls import reverse
 
-from ..models import User, Profile, Country, Publication
+from ..models import User, Profile, Country, Publication, OutboxEmail
 
 
 class AdminTestMixin:
@@ -105,3 +105,16 @@ class UserAdminTests(AdminTestMixin, TestCase):
         response = self.client.get(url, {'q': 'admin'})
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, 'admin')
+
+
+class OutboxEmailAdminTests(AdminTestMixin, TestCase):
+
+    def test_change_page_hides_body(self):
+        email = OutboxEmail.objects.create(
+            subject='Reset your password', body='https://example.com/reset/abc',
+            from_email='noreply@test.com', to=['ada@example.com'],
+        )
+        url = reverse('admin:profiles_outboxemail_change', args=[email.pk])
+        response = self.client.get(url)
+        self.assertContains(response, 'Reset your password')
+        self.assertNotContains(response, '/reset/abc')
@@ -0,0 +1,172 @@
+import re
+from datetime import timedelta
+from unittest import mock
+
+from django.core import mail
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from profiles.emails import (
+    OUTBOX_MAX_ATTEMPTS,
+    OUTBOX_RETRY_DELAY,
+    enqueue_email,
+    send_email,
+    send_outbox,
+    send_password_resets,
+    test_email,
+)
+from profiles.models import OutboxEmail, PasswordResetRequest, User
+from profiles.tokens import UserPasswordResetToken
+
+
+def message(to='test@test.com'):
+    message = test_email(to)
+    message.extra_headers['Reply-To'] = 'reply@test.com'
+    return message
+
+
+@override_settings(EMAIL_OUTBOX=True)
+class OutboxTests(TestCase):
+
+    def test_send_email_enqueues(self):
+        send_email(message())
+        self.assertEqual(len(mail.outbox), 0)
+
+        email = OutboxEmail.objects.get()
+        self.assertEqual(email.to, ['test@test.com'])
+        self.assertIn('Reply-To', email.headers)
+        self.assertTrue(email.html_body)
+
+    @override_settings(EMAIL_OUTBOX=False)
+    def test_send_email_without_outbox(self):
+        send_email(message())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertFalse(OutboxEmail.objects.exists())
+
+    @override_settings(EMAIL_OUTBOX=False)
+    def test_enqueue_email(self):
+        enqueue_email(message())
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutboxEmail.objects.get().to, ['test@test.com'])
+
+    def test_send_outbox(self):
+        sent = message()
+        send_email(sent)
+        send_email(message('other@test.com'))
+
+        self.assertEqual(send_outbox(), (2, 0))
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(mail.outbox[0].subject, sent.subject)
+        self.assertEqual(mail.outbox[0].to, ['test@test.com'])
+        self.assertEqual(mail.outbox[0].extra_headers, sent.extra_headers)
+        self.assertEqual(mail.outbox[0].alternatives, sent.alternatives)
+        self.assertFalse(OutboxEmail.objects.pending().exists())
+        self.assertFalse(OutboxEmail.objects.exclude(body='').exists())
+        self.assertFalse(OutboxEmail.objects.exclude(html_body='').exists())
+
+        # sent only once
+        self.assertEqual(send_outbox(), (0, 0))
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_send_outbox_batch(self):
+        for _ in range(3):
+            send_email(message())
+
+        self.assertEqual(send_outbox(batch_size=2), (2, 0))
+        self.assertEqual(send_outbox(batch_size=2), (1, 0))
+
+    def test_send_outbox_retries(self):
+        send_email(message())
+
+        with mock.patch(
+            'django.core.mail.backends.locmem.EmailBackend.send_messages',
+            side_effect=ConnectionError('unreachable'),
+        ), self.assertLogs('profiles.emails', 'ERROR'):
+            self.assertEqual(send_outbox(), (0, 1))
+
+        email = OutboxEmail.objects.get()
+        self.assertEqual(email.attempts, 1)
+        self.assertIn('unreachable', email.last_error)
+        self.assertIsNone(email.failed_at)
+        self.assertGreater(email.send_after, timezone.now())
+
+        # not due yet
+        self.assertEqual(send_outbox(), (0, 0))
+
+        OutboxEmail.objects.update(send_after=timezone.now())
+        self.assertEqual(send_outbox(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_send_outbox_backoff(self):
+        send_email(message())
+
+        with mock.patch(
+            'django.core.mail.backends.locmem.EmailBackend.send_messages',
+            side_effect=ConnectionError,
+        ), self.assertLogs('profiles.emails', 'ERROR'):
+            for attempt in range(1, OUTBOX_MAX_ATTEMPTS + 1):
+                OutboxEmail.objects.update(send_after=timezone.now())
+                before = timezone.now()
+                self.assertEqual(send_outbox(), (0, 1))
+
+                email = OutboxEmail.objects.get()
+                self.assertEqual(email.attempts, attempt)
+                self.assertGreaterEqual(
+                    email.send_after - before,
+                    OUTBOX_RETRY_DELAY * 2 ** (attempt - 1),
+                )
+
+        self.assertIsNotNone(email.failed_at)
+        OutboxEmail.objects.update(send_after=timezone.now())
+        self.assertEqual(send_outbox(), (0, 0))
+
+    def test_send_outbox_claimed(self):
+        send_email(message())
+        OutboxEmail.objects.update(send_after=timezone.now() - timedelta(seconds=1))
+
+        pending = OutboxEmail.objects.pending
+
+        def stale_pending(now=None):
+            emails = list(pending(now))
+            # claimed by another worker meanwhile
+            OutboxEmail.objects.update(send_after=timezone.now())
+            return emails
+
+        with mock.patch.object(OutboxEmail.objects, 'pending', stale_pending):
+            self.assertEqual(send_outbox(), (0, 0))
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_command(self):
+        send_email(message())
+        call_command('send_outbox', stdout=mock.Mock())
+        self.assertEqual(len(mail.outbox), 1)
+
+    @override_settings(EMAIL_OUTBOX=False)
+    def test_send_password_resets(self):
+        # always queued, whatever EMAIL_OUTBOX
+        user = User.objects.create(email='test@test.com', is_active=True)
+        for email in ('test@test.com', 'unknown@test.com'):
+            PasswordResetRequest.objects.create(
+                email=email, base_url='https://example.com/',
+            )
+
+        self.assertEqual(send_password_resets(), 2)
+        self.assertFalse(PasswordResetRequest.objects.exists())
+        self.assertEqual(len(mail.outbox), 0)
+        email = OutboxEmail.objects.get()
+        self.assertEqual(email.to, ['test@test.com'])
+        token = re.search(
+            r'https://example\.com/\S+\?token=(\S+)', email.body,
+        ).group(1)
+        self.assertEqual(UserPasswordResetToken.check(token)['sub'], user.id)
+
+        self.assertEqual(send_password_resets(), 0)
+
+    def test_command_sends_password_resets(self):
+        User.objects.create(email='test@test.com', is_active=True)
+        PasswordResetRequest.objects.create(
+            email='test@test.com', base_url='http://testserver/',
+        )
+        call_command('send_outbox', stdout=mock.Mock())
+        self.assertEqual(mail.outbox[0].to, ['test@test.com'])
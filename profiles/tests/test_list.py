@@ -1,7 +1,18 @@
-from django.test import TestCase
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
 from django.urls import reverse
 
-from ..models import Profile, Country, Recommendation
+from ..models import (
+    POSITION_SENIORITY,
+    Country,
+    Profile,
+    Recommendation,
+    Seniority,
+    User,
+    position_seniority,
+)
 
 
 default_user = {
@@ -107,3 +118,344 @@ class ProfileListViewTests(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertTrue(len(self.profiles) > 20)
         self.assertEqual(len(response.context['profiles']), 20)
+
+
+class ProfileListFiltersTests(TestCase):
+
+    def setUp(self):
+        self.ch = Country.objects.create(code='CH', name='Switzerland')
+        self.ng = Country.objects.create(
+            code='NG', name='Nigeria', is_under_represented=True,
+        )
+        for i, position in enumerate(
+            ('PhD student', 'Assistant Professor',
+             'Group leader/ Director/ Head of Department', ''),
+        ):
+            Profile.objects.create(
+                name=f'User {i}', institution='Institute', position=position,
+                country=self.ng if i % 2 else self.ch,
+            )
+
+    def get_names(self, **params):
+        response = self.client.get(reverse('profiles:index'), params)
+        return sorted(p.name for p in response.context['profiles'])
+
+    def test_seniority(self):
+        self.assertEqual(
+            list(Profile.objects.order_by('name').values_list('seniority', flat=True)),
+            [Seniority.JUNIOR, Seniority.SENIOR, Seniority.SENIOR, Seniority.UNKNOWN],
+        )
+        self.assertEqual(self.get_names(senior='on'), ['User 1', 'User 2'])
+
+        profile = Profile.objects.get(name='User 0')
+        profile.position = 'Lecturer'
+        profile.save()
+        self.assertEqual(self.get_names(senior='on'), ['User 0', 'User 1', 'User 2'])
+
+    def test_seniority_covers_positions(self):
+        for position, _ in Profile._meta.get_field('position').choices:
+            self.assertIn(position, POSITION_SENIORITY)
+
+    def test_seniority_of_other_positions(self):
+        self.assertEqual(
+            position_seniority('Principal Investigator'), Seniority.SENIOR,
+        )
+        self.assertEqual(position_seniority('Research fellow'), Seniority.UNKNOWN)
+
+        profile = Profile.objects.get(name='User 0')
+        profile.position = 'Principal Investigator'
+        profile.save()
+        self.assertEqual(self.get_names(senior='on'), ['User 0', 'User 1', 'User 2'])
+
+    def test_under_represented(self):
+        self.assertEqual(self.get_names(ur='on'), ['User 1', 'User 3'])
+        self.assertEqual(self.get_names(ur='on', senior='on'), ['User 1'])
+
+        country = Country.objects.get(code='CH')
+        country.is_under_represented = True
+        country.save()
+        self.assertEqual(
+            self.get_names(ur='on'), ['User 0', 'User 1', 'User 2', 'User 3'],
+        )
+
+        profile = Profile.objects.get(name='User 1')
+        profile.country = country
+        profile.save()
+        self.ng.is_under_represented = False
+        self.ng.save()
+        self.assertEqual(self.get_names(ur='on'), ['User 0', 'User 1', 'User 2'])
+
+
+class ProfileListQueriesTests(TestCase):
+
+    def setUp(self):
+        self.country = Country.objects.create(code='CH', name='Switzerland')
+
+    def create_profiles(self, count):
+        start = Profile.objects.count()
+        for i in range(start, start + count):
+            user = User.objects.create_user(
+                username=f'user{i}', email=f'user{i}@test.com', password='test',
+            )
+            profile = Profile.objects.create(
+                name=f'User {i}', institution='ETH Zurich',
+                country=self.country, user=user,
+            )
+            Recommendation.objects.create(
+                profile=profile, reviewer_name='Reviewer',
+                reviewer_institution='MIT', comment='Great',
+            )
+
+    def test_recommendation_count_displayed(self):
+        self.create_profiles(1)
+        response = self.client.get(reverse('profiles:index'))
+        self.assertEqual(response.context['profiles'][0].recommendation_count, 1)
+        self.assertContains(response, '<i class="fas fa-comment num-rec"></i> 1')
+
+    def test_queries_do_not_grow_with_page_size(self):
+        self.create_profiles(21)
+        with self.assertNumQueries(2):
+            self.client.get(reverse('profiles:index'))
+
+        self.create_profiles(20)
+        with self.assertNumQueries(2):
+            self.client.get(reverse('profiles:index'))
+        with self.assertNumQueries(2):
+            self.client.get(reverse('profiles:index'), {'s': 'zurich'})
+
+    def test_cursor_pagination(self):
+        self.create_profiles(45)
+        expected = list(
+            Profile.objects.order_by('-published_at', '-id')
+            .values_list('name', flat=True)
+        )
+
+        names = []
+        response = self.client.get(reverse('profiles:index'))
+        while True:
+            page = response.context['page_obj']
+            self.assertEqual(page.paginator.count, 45)
+            names += [p.name for p in response.context['profiles']]
+            if not page.has_next():
+                self.assertNotContains(response, 'infinite-more-link')
+                break
+
+            self.assertContains(response, 'infinite-more-link')
+            # the total count travels in the cursor
+            with self.assertNumQueries(1):
+                response = self.client.get(
+                    reverse('profiles:index'), {'cursor': page.next_cursor},
+                )
+
+        self.assertEqual(names, expected)
+
+    def test_cursor_single_page(self):
+        self.create_profiles(3)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('profiles:index'))
+        self.assertEqual(response.context['page_obj'].paginator.count, 3)
+        self.assertNotContains(response, 'infinite-more-link')
+
+    def test_cached_counts(self):
+        self.create_profiles(21)
+        url = reverse('profiles:index')
+        with self.assertNumQueries(2):
+            response = self.client.get(url, {'s': 'zurich eth'})
+        self.assertEqual(response.context['page_obj'].paginator.count, 21)
+
+        # the same filter, whatever the order and case of the terms
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {'s': 'ETH  Zurich', 'page': 2})
+        self.assertEqual(response.context['page_obj'].paginator.count, 21)
+        # another filter needs its own count, no rows match
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {'s': 'zurich', 'senior': 'on'})
+        self.assertEqual(response.context['page_obj'].paginator.count, 0)
+
+        Profile.objects.filter(name='User 0').get().delete()
+        with self.assertNumQueries(2):
+            response = self.client.get(url, {'s': 'zurich eth'})
+        self.assertEqual(response.context['page_obj'].paginator.count, 20)
+
+    def test_explain_queries(self):
+        self.create_profiles(3)
+        out = StringIO()
+        call_command('explain_queries', stdout=out)
+        output = out.getvalue()
+        self.assertRegex(
+            output,
+            r'Repository list: uses profile_listed_idx',
+        )
+        self.assertIn(
+            'Unclaimed profile by contact e-mail: uses profile_contact_email_idx',
+            output,
+        )
+        self.assertIn(
+            'Position statistics refresh: uses profile_position_alive_idx',
+            output,
+        )
+
+    def test_partial_response(self):
+        self.create_profiles(21)
+        response = self.client.get(reverse('profiles:index'))
+        cursor = response.context['page_obj'].next_cursor
+        self.assertIn('X-Requested-With', response['Vary'])
+
+        response = self.client.get(
+            reverse('profiles:index'), {'cursor': cursor},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+        )
+        self.assertTemplateUsed(response, 'profiles/list_rows.html')
+        self.assertTemplateNotUsed(response, 'base.html')
+        self.assertContains(response, 'infinite-item', count=1)
+        self.assertNotContains(response, 'infinite-more-link')
+        self.assertNotContains(response, 'search-form')
+
+        response = self.client.get(reverse('profiles:index'), {'partial': 1})
+        self.assertContains(response, 'infinite-item', count=20)
+        self.assertContains(response, 'infinite-more-link')
+        self.assertNotContains(response, '<html')
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('profiles:index'), {'cursor': 'x'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_search_keeps_page_numbers(self):
+        self.create_profiles(21)
+        response = self.client.get(reverse('profiles:index'), {'s': 'zurich'})
+        self.assertContains(response, 'page=2')
+        response = self.client.get(reverse('profiles:index'), {'page': 2})
+        self.assertEqual(len(response.context['profiles']), 1)
+
+
+class ProfileSearchTests(TestCase):
+
+    def setUp(self):
+        self.ch = Country.objects.create(code='CH', name='Switzerland')
+        self.ng = Country.objects.create(code='NG', name='Nigeria')
+        self.ada = Profile.objects.create(
+            name='Ada Lovelace',
+            institution='ETH Zurich',
+            position='Professor',
+            country=self.ch,
+            modalities='EP',
+            domains='AT',
+            keywords='attention',
+        )
+        self.ngozi = Profile.objects.create(
+            name='Ngozi Okafor',
+            institution='University of Lagos',
+            position='PhD student',
+            country=self.ng,
+            modalities='FN',
+            domains='SL',
+            keywords='sleep',
+        )
+
+    def search(self, s):
+        response = self.client.get(reverse('profiles:index'), {'s': s})
+        self.assertEqual(response.status_code, 200)
+        return [p.name for p in response.context['profiles']]
+
+    def test_search_document_built_on_save(self):
+        self.assertIn('eth zurich', self.ada.search_document)
+        self.assertIn('switzerland', self.ada.search_document)
+        self.assertIn('electrophysiology', self.ada.search_document)
+
+    def test_search_document_folds_accents(self):
+        self.ada.institution = 'Université de Genève'
+        self.ada.save()
+        self.assertIn('universite de geneve', self.ada.search_document)
+        self.assertEqual(self.search('Genève'), ['Ada Lovelace'])
+        self.assertEqual(self.search('geneve'), ['Ada Lovelace'])
+
+    def test_search_follows_country_rename(self):
+        updated_at = Profile.objects.get(pk=self.ada.pk).updated_at
+        country = Country.objects.get(pk=self.ch.pk)
+        country.name = 'Confoederatio Helvetica'
+        country.save()
+        self.assertEqual(self.search('helvetica'), ['Ada Lovelace'])
+        self.assertEqual(self.search('switzerland'), [])
+        # the change reaches the clients of the search API
+        self.assertGreater(
+            Profile.objects.get(pk=self.ada.pk).updated_at, updated_at,
+        )
+
+    def test_rebuild_search_documents_command(self):
+        Profile.objects.filter(pk=self.ada.pk).update(
+            search_document='',
+        )
+        out = StringIO()
+        call_command('rebuild_search_documents', chunk_size=1, stdout=out)
+        self.assertIn('2 profiles', out.getvalue())
+        self.ada.refresh_from_db()
+        self.assertIn('eth zurich', self.ada.search_document)
+        self.assertEqual(self.search('zurich'), ['Ada Lovelace'])
+
+    def test_search_matches_fields(self):
+        self.assertEqual(self.search('zurich'), ['Ada Lovelace'])
+        self.assertEqual(self.search('Nigeria'), ['Ngozi Okafor'])
+        self.assertEqual(self.search('sleep'), ['Ngozi Okafor'])
+
+    def test_search_matches_prefixes(self):
+        self.assertEqual(self.search('Lov'), ['Ada Lovelace'])
+        self.assertEqual(self.search('electro'), ['Ada Lovelace'])
+
+    def test_search_matches_substrings(self):
+        self.assertEqual(self.search('urich'), ['Ada Lovelace'])
+        self.assertEqual(self.search('ngozi agos'), ['Ngozi Okafor'])
+        self.assertEqual(self.search('ur'), ['Ada Lovelace'])
+        # whatever the other profiles, private ones included
+        Profile.objects.create(
+            name='Hidden Profile', institution='Secret Lab',
+            keywords='imaging', is_public=False,
+        )
+        self.ngozi.keywords = 'neuroimaging'
+        self.ngozi.save()
+        self.assertEqual(self.search('imaging'), ['Ngozi Okafor'])
+
+    def test_search_matches_choice_labels(self):
+        self.assertEqual(self.search('physiology'), ['Ada Lovelace'])
+        self.assertEqual(self.search('(eeg,'), ['Ada Lovelace'])
+        self.assertEqual(self.search('NIRS'), ['Ngozi Okafor'])
+
+    def test_search_requires_all_terms(self):
+        self.assertEqual(self.search('ada zurich'), ['Ada Lovelace'])
+        self.assertEqual(self.search('ada lagos'), [])
+
+    def test_search_follows_updates(self):
+        self.ada.institution = 'Imperial College'
+        self.ada.save()
+        self.assertEqual(self.search('zurich'), [])
+        self.assertEqual(self.search('imperial'), ['Ada Lovelace'])
+
+    def test_search_ranks_by_relevance(self):
+        Profile.objects.create(
+            name='Grace Hopper',
+            institution='Yale',
+            country=self.ch,
+            keywords='sleep',
+        )
+        self.ngozi.keywords = 'sleep, sleep disorders, sleep spindles'
+        self.ngozi.save()
+        self.assertEqual(self.search('sleep'), ['Ngozi Okafor', 'Grace Hopper'])
+
+    def test_search_special_characters(self):
+        for s in ('"', 'a"b', 'NEAR', 'AND', '-', "o'brien",
+                  '*', '(', '.*', '[a-', '(a+)+$', '\\'):
+            self.search(s)
+
+    @override_settings(SEARCH_BACKEND='profiles.search.BasicSearchBackend')
+    def test_search_basic_backend(self):
+        self.assertEqual(self.search('zurich'), ['Ada Lovelace'])
+        self.assertEqual(self.search('ada lagos'), [])
+        self.assertEqual(self.search('urich'), ['Ada Lovelace'])
+        self.assertEqual(self.search('ur'), ['Ada Lovelace'])
+
+    def test_autocomplete_uses_search_document(self):
+        response = self.client.get(
+            reverse('profiles:profiles_autocomplete'), {'q': 'ngozi lagos'},
+        )
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual([r['id'] for r in results], [str(self.ngozi.pk)])
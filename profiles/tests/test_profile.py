@@ -1,5 +1,7 @@
 from http import HTTPStatus
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.contrib.messages import get_messages, constants
 
@@ -60,3 +62,65 @@ class ProfileTests(TestCase):
 
         with self.assertRaises(Profile.DoesNotExist):
             p.refresh_from_db()
+
+
+class ProfileDetailCacheTests(TestCase):
+
+    def setUp(self):
+        self.profile = Profile.objects.create(
+            name='Ada Lovelace', institution='ETH Zurich', domains='AT',
+        )
+        self.url = reverse('profiles:detail', args=[self.profile.id])
+        self.viewer = User.objects.create(
+            email='viewer@test.com', username='viewer', is_active=True,
+        )
+        self.client.force_login(self.viewer)
+
+    def recommend(self, comment):
+        return Recommendation.objects.create(
+            profile=self.profile, reviewer_name='Reviewer',
+            reviewer_institution='MIT', comment=comment,
+        )
+
+    def test_caches_profile_body(self):
+        self.recommend('Great speaker')
+        with CaptureQueriesContext(connection) as first:
+            self.assertContains(self.client.get(self.url), 'Great speaker')
+        with CaptureQueriesContext(connection) as second:
+            response = self.client.get(self.url)
+        self.assertContains(response, 'Great speaker')
+        self.assertContains(response, 'Attention')
+        self.assertEqual(len(first) - len(second), 1)
+
+    def test_constant_query_count(self):
+        counts = []
+        for total in (1, 5, 20):
+            while self.profile.recommendations.count() < total:
+                self.recommend('Great speaker')
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(self.url)
+            self.assertContains(response, 'Great speaker', count=total)
+            counts.append(len(queries))
+        self.assertEqual(len(set(counts)), 1, counts)
+
+    def test_invalidated_by_changes(self):
+        self.client.get(self.url)
+        self.recommend('Great speaker')
+        self.assertContains(self.client.get(self.url), 'Great speaker')
+
+        self.profile.institution = 'University of Oxford'
+        self.profile.save()
+        self.assertContains(self.client.get(self.url), 'University of Oxford')
+
+    def test_viewer_parts(self):
+        self.assertContains(self.client.get(self.url), 'writing her one')
+        self.assertContains(self.client.get(self.url), 'Claim')
+
+        owner = User.objects.create(
+            email='ada@test.com', username='ada', is_active=True,
+        )
+        Profile.objects.filter(pk=self.profile.pk).update(user=owner)
+        self.client.force_login(owner)
+        response = self.client.get(self.url)
+        self.assertNotContains(response, 'writing her one')
+        self.assertNotContains(response, 'Claim')
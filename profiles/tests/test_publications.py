@@ -0,0 +1,45 @@
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import Publication
+from ..search import PUBLICATION_TYPE_RESOLVER
+
+
+class PublicationsListTests(TestCase):
+
+    def setUp(self):
+        Publication.objects.create(
+            type='PP',
+            title='Gender gaps in citations',
+            authors='Doe, J.',
+            published_at='2020-01-01',
+        )
+        Publication.objects.create(
+            type='BO',
+            title='Women in science',
+            authors='Roe, R.',
+            published_at='2021-01-01',
+        )
+
+    def search(self, s):
+        response = self.client.get(reverse('profiles:publications'), {'s': s})
+        self.assertEqual(response.status_code, 200)
+        return [p.title for p in response.context['publications']]
+
+    def test_search_matches_text(self):
+        self.assertEqual(self.search('citations'), ['Gender gaps in citations'])
+
+    def test_search_matches_type_labels(self):
+        self.assertEqual(self.search('preprint'), ['Gender gaps in citations'])
+        self.assertEqual(self.search('book'), ['Women in science'])
+
+    def test_search_special_characters(self):
+        for s in ('*', '(', '.*', '[a-', '(a+)+$'):
+            self.assertEqual(self.search(s), [])
+
+    def test_resolver(self):
+        self.assertEqual(
+            dict(PUBLICATION_TYPE_RESOLVER.resolve('PAPER')),
+            {'type': ('JP',)},
+        )
+        self.assertEqual(dict(PUBLICATION_TYPE_RESOLVER.resolve('(')), {})
@@ -1,7 +1,44 @@
-from django.test import TestCase
+import gzip
+from io import StringIO
+import json
+import os
+import tempfile
+import threading
+from datetime import timedelta
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+
+from ..models import (
+    LABEL_TOKENS,
+    Country,
+    CountryStatistic,
+    PositionStatistic,
+    Profile,
+    Recommendation,
+    User,
+)
+from ..snapshots import (
+    Debouncer,
+    brotli,
+    build_snapshot,
+    dataset_version,
+    find_snapshot,
+    rebuild_snapshot,
+    snapshot_path,
+)
+from ..tokens import ProfileChangesToken
+from ..views import StreamingListMixin
 
-from ..models import User, Profile, Country, Recommendation
+
+def streamed_json(response):
+    """JSON of a streamed API list."""
+    return json.loads(b''.join(response.streaming_content))
 
 
 class ProfileSearchAPITests(TestCase):
@@ -47,7 +84,7 @@ class ProfileSearchAPITests(TestCase):
         url = '/api/profiles/?format=json'
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
-        names = [p['name'] for p in response.json()]
+        names = [p['name'] for p in streamed_json(response)]
         self.assertIn('Ada Lovelace', names)
         self.assertIn('Ngozi Okafor', names)
         self.assertNotIn('Hidden Profile', names)
@@ -55,7 +92,9 @@ class ProfileSearchAPITests(TestCase):
     def test_api_contains_expected_fields(self):
         url = '/api/profiles/?format=json'
         response = self.client.get(url)
-        profile = next(p for p in response.json() if p['name'] == 'Ada Lovelace')
+        profile = next(
+            p for p in streamed_json(response) if p['name'] == 'Ada Lovelace'
+        )
         self.assertEqual(profile['institution'], 'ETH Zurich')
         self.assertEqual(profile['position'], 'Professor')
         self.assertEqual(profile['country_name'], 'Switzerland')
@@ -70,7 +109,7 @@ class ProfileSearchAPITests(TestCase):
         url = '/api/profiles/?format=json'
         response = self.client.get(url)
         # response is a list, not a paginated dict
-        self.assertIsInstance(response.json(), list)
+        self.assertIsInstance(streamed_json(response), list)
 
     def test_api_includes_recommendation_count(self):
         Recommendation.objects.create(
@@ -87,11 +126,455 @@ class ProfileSearchAPITests(TestCase):
         )
         url = '/api/profiles/?format=json'
         response = self.client.get(url)
-        profile = next(p for p in response.json() if p['name'] == 'Ada Lovelace')
+        profile = next(
+            p for p in streamed_json(response) if p['name'] == 'Ada Lovelace'
+        )
         self.assertEqual(profile['recommendation_count'], 2)
 
     def test_under_represented_flag(self):
         url = '/api/profiles/?format=json'
         response = self.client.get(url)
-        ng_profile = next(p for p in response.json() if p['name'] == 'Ngozi Okafor')
+        ng_profile = next(
+            p for p in streamed_json(response) if p['name'] == 'Ngozi Okafor'
+        )
         self.assertTrue(ng_profile['country_is_under_represented'])
+
+    def test_api_filters_by_facets(self):
+        url = '/api/profiles/?format=json&modalities=FN,PE'
+        names = [p['name'] for p in streamed_json(self.client.get(url))]
+        self.assertEqual(names, ['Ngozi Okafor'])
+
+        url = '/api/profiles/?format=json&modalities=EP&domains=SL'
+        self.assertEqual(streamed_json(self.client.get(url)), [])
+
+    def test_api_selects_fields(self):
+        url = '/api/profiles/?format=json&fields=id,name,unknown'
+        response = self.client.get(url)
+        self.assertEqual(
+            {tuple(p) for p in streamed_json(response)}, {('id', 'name')},
+        )
+
+    def test_columnar_format(self):
+        Profile.objects.create(
+            name='Grace Hopper',
+            institution='ETH Zurich',
+            position='Professor',
+            country=self.ch,
+            modalities='MR',
+        )
+        url = '/api/profiles/?format=columnar'
+        response = self.client.get(url)
+        self.assertEqual(
+            response['Content-Type'], 'application/vnd.winrepo.columnar+json',
+        )
+        data = response.json()
+        expected = streamed_json(self.client.get('/api/profiles/?format=json'))
+        self.assertEqual(data['fields'], list(expected[0]))
+
+        # decoding the rows gives back the JSON format
+        dictionaries = data['dictionaries']
+        decoded = []
+        for row in data['rows']:
+            profile = dict(zip(data['fields'], row))
+            for name, values in dictionaries.items():
+                if isinstance(profile[name], list):
+                    profile[name] = ', '.join(
+                        values[index] for index in profile[name]
+                    )
+                else:
+                    profile[name] = values[profile[name]]
+            decoded.append(profile)
+        self.assertEqual(decoded, expected)
+
+        # the shared institution and country are only sent once
+        self.assertEqual(
+            dictionaries['country_name'], ['Switzerland', 'Nigeria'],
+        )
+        self.assertEqual(
+            sorted(dictionaries['institution']),
+            ['ETH Zurich', 'University of Lagos'],
+        )
+
+    def test_columnar_format_selects_fields(self):
+        url = '/api/profiles/?format=columnar&fields=name,domains_display'
+        data = self.client.get(url).json()
+        self.assertEqual(data['fields'], ['name', 'domains_display'])
+        self.assertEqual(
+            data['dictionaries'],
+            {'domains_display': ['Sleep', 'Attention', 'Memory']},
+        )
+        self.assertEqual(
+            data['rows'], [['Ngozi Okafor', [0]], ['Ada Lovelace', [1, 2]]],
+        )
+
+        # only the dataset version is queried once cached
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get(url).json(), data)
+
+    @mock.patch.object(StreamingListMixin, 'stream_chunk_size', 1)
+    def test_streamed_list(self):
+        Profile.objects.filter(pk=self.profile_ng.pk).update(
+            published_at=self.profile_ch.published_at,
+        )
+        for url, expected in (
+            ('/api/profiles/?format=json', ['Ngozi Okafor', 'Ada Lovelace']),
+            ('/api/profiles/?format=json&fields=name&domains=SL', ['Ngozi Okafor']),
+        ):
+            with self.subTest(url=url):
+                # the two of the ETag, one per chunk of a row and one for
+                # the empty last chunk
+                with self.assertNumQueries(len(expected) + 3):
+                    response = self.client.get(url)
+                    self.assertTrue(response.streaming)
+                    self.assertEqual(response['Content-Type'], 'application/json')
+                    chunks = list(response.streaming_content)
+                self.assertEqual(len(chunks), len(expected) + 2)
+                self.assertEqual(
+                    [p['name'] for p in json.loads(b''.join(chunks))], expected,
+                )
+
+    def test_streamed_list_empty(self):
+        url = '/api/profiles/?format=json&modalities=PE'
+        response = self.client.get(url)
+        self.assertEqual(b''.join(response.streaming_content), b'[]')
+
+    def assertNotModified(self, url, etag):
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def assertModified(self, url, etag):
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        return response['ETag']
+
+    def test_conditional_get(self):
+        url = '/api/profiles/?format=json'
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertIn('no-cache', response['Cache-Control'])
+        with self.assertNumQueries(2):
+            self.assertNotModified(url, etag)
+
+        # other filters get their own version
+        self.assertModified(url + '&modalities=EP', etag)
+
+        self.profile_ng.keywords = 'sleep'
+        self.profile_ng.save()
+        etag = self.assertModified(url, etag)
+
+        Recommendation.objects.create(
+            profile=self.profile_ng, reviewer_name='Reviewer',
+            reviewer_institution='MIT', comment='Great',
+        )
+        etag = self.assertModified(url, etag)
+
+        self.ng.name = 'Federal Republic of Nigeria'
+        self.ng.save()
+        etag = self.assertModified(url, etag)
+
+        self.profile_ng.hard_delete()
+        etag = self.assertModified(url, etag)
+        self.assertNotModified(url, etag)
+
+    def test_username_changes(self):
+        url = '/api/profiles/?format=json'
+        etag = self.client.get(url)['ETag']
+        version = dataset_version()
+        Profile.all_objects.update(updated_at=timezone.now() - timedelta(hours=1))
+        token = ProfileChangesToken.generate(timezone.now() - timedelta(minutes=30))
+
+        self.user.username = 'ada2'
+        self.user.save()
+        self.assertModified(url, etag)
+        self.assertNotEqual(dataset_version(), version)
+        data = self.client.get(
+            '/api/profiles/changes/?format=json', {'since': token},
+        ).json()
+        self.assertEqual(
+            [p['username'] for p in data['changed']], ['ada2'],
+        )
+
+    def test_changes(self):
+        url = '/api/profiles/changes/?format=json'
+        data = self.client.get(url).json()
+        self.assertTrue(data['reset'])
+        self.assertEqual(data['count'], 2)
+
+        # everything older than the overlap is already known
+        Profile.all_objects.update(updated_at=timezone.now() - timedelta(hours=1))
+        token = ProfileChangesToken.generate(timezone.now() - timedelta(minutes=30))
+        data = self.client.get(url, {'since': token}).json()
+        self.assertFalse(data['reset'])
+        self.assertEqual((data['changed'], data['removed']), ([], []))
+
+        self.profile_ng.keywords = 'sleep'
+        self.profile_ng.save()
+        Recommendation.objects.create(
+            profile=self.profile_ch, reviewer_name='Reviewer',
+            reviewer_institution='MIT', comment='Great',
+        )
+        new = Profile.objects.create(name='Grace Hopper', institution='Yale')
+        hidden = Profile.objects.get(name='Hidden Profile')
+        hidden.keywords = 'secret'
+        hidden.save()
+
+        data = self.client.get(url, {'since': token}).json()
+        self.assertEqual(data['count'], 3)
+        self.assertEqual(
+            {p['name']: p['recommendation_count'] for p in data['changed']},
+            {'Ada Lovelace': 1, 'Ngozi Okafor': 0, 'Grace Hopper': 0},
+        )
+        self.assertEqual(data['removed'], [hidden.pk])
+
+        new.delete()
+        self.profile_ch.is_public = False
+        self.profile_ch.save()
+        data = self.client.get(url, {'since': data['token']}).json()
+        self.assertEqual(data['count'], 1)
+        self.assertEqual(
+            sorted(data['removed']),
+            sorted([new.pk, self.profile_ch.pk, hidden.pk]),
+        )
+
+    def test_changes_invalid_token(self):
+        data = self.client.get(
+            '/api/profiles/changes/?format=json', {'since': 'x'},
+        ).json()
+        self.assertTrue(data['reset'])
+        self.assertEqual(data['changed'], [])
+
+
+class ProfileSnapshotTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        settings = override_settings(PROFILES_SNAPSHOT_DIR=self.directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        country = Country.objects.create(code='CH', name='Switzerland')
+        self.profile = Profile.objects.create(
+            name='Ada Lovelace', institution='ETH Zurich', country=country,
+        )
+
+    def get(self, url='/api/profiles/?format=json'):
+        return self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+
+    def test_serves_snapshot(self):
+        expected = streamed_json(self.get())
+        version = build_snapshot()
+        self.assertTrue(os.path.exists(snapshot_path(version, '.gz')))
+
+        with self.assertNumQueries(2):
+            response = self.get()
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        content = gzip.decompress(b''.join(response.streaming_content))
+        self.assertEqual(json.loads(content), expected)
+
+        # filtered and non-JSON answers are not prebuilt
+        self.assertFalse(self.get(
+            '/api/profiles/?format=json&modalities=EP',
+        ).has_header('Content-Encoding'))
+        self.assertFalse(self.get(
+            '/api/profiles/?format=json&fields=name',
+        ).has_header('Content-Encoding'))
+        self.assertFalse(self.get(
+            '/api/profiles/?format=columnar',
+        ).has_header('Content-Encoding'))
+        self.assertFalse(self.client.get(
+            '/api/profiles/?format=json',
+        ).has_header('Content-Encoding'))
+
+    def test_negotiates_encoding(self):
+        version = build_snapshot()
+        etags = {}
+        for accept_encoding, encoding in (
+            ('gzip, deflate', 'gzip'),
+            ('gzip;q=0, deflate', None),
+            ('*;q=0.5, gzip;q=0', 'br' if brotli else None),
+            ('identity', None),
+            ('', None),
+        ):
+            with self.subTest(accept_encoding=accept_encoding):
+                with self.captureOnCommitCallbacks() as callbacks:
+                    response = self.client.get(
+                        '/api/profiles/?format=json',
+                        HTTP_ACCEPT_ENCODING=accept_encoding,
+                    )
+                self.assertEqual(response.get('Content-Encoding'), encoding)
+                self.assertIn('Accept-Encoding', response['Vary'])
+                # the snapshot is current, nothing to rebuild
+                self.assertEqual(callbacks, [])
+                etags.setdefault(encoding, set()).add(response['ETag'])
+        # one ETag per encoding
+        self.assertEqual(
+            len(set.union(*etags.values())), len(etags),
+        )
+        self.assertTrue(all(len(tags) == 1 for tags in etags.values()))
+
+        self.assertEqual(find_snapshot(version, 'gzip;q=0.5, br;q=0.1'), (
+            snapshot_path(version, '.gz'), 'gzip',
+        ))
+
+    def test_stale_snapshot(self):
+        build_snapshot()
+        self.profile.name = 'Ada King'
+        self.profile.save()
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.get()
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(streamed_json(response)[0]['name'], 'Ada King')
+        self.assertEqual(callbacks, [rebuild_snapshot])
+
+        # a new snapshot replaces the previous one
+        version = build_snapshot()
+        self.assertEqual(
+            os.listdir(self.directory.name),
+            [os.path.basename(snapshot_path(version, '.gz'))],
+        )
+
+    def test_debouncer(self):
+        calls = []
+        done = threading.Event()
+
+        def func():
+            calls.append(1)
+            done.set()
+
+        debounced = Debouncer(func, 0.05)
+        for i in range(5):
+            debounced()
+        self.assertTrue(done.wait(5))
+        self.assertEqual(calls, [1])
+
+
+class ProfileStatisticsTests(TestCase):
+
+    def setUp(self):
+        self.ch = Country.objects.create(code='CH', name='Switzerland')
+        self.ng = Country.objects.create(code='NG', name='Nigeria')
+        self.profiles = [
+            Profile.objects.create(
+                name=f'User {i}', institution='ETH Zurich', country=self.ch,
+                position='Professor',
+            )
+            for i in range(3)
+        ]
+        Profile.objects.create(
+            name='Ngozi Okafor', institution='University of Lagos',
+            country=self.ng, position='PhD student',
+        )
+        Profile.objects.create(
+            name='Hidden Profile', institution='Secret Lab', country=self.ng,
+            position='Professor', is_public=False,
+        )
+
+    def get_counts(self):
+        with self.assertNumQueries(1):
+            countries = self.client.get('/api/countries/?format=json').json()
+        with self.assertNumQueries(1):
+            positions = self.client.get('/api/positions/?format=json').json()
+        return (
+            {c['name']: c['profiles_count'] for c in countries},
+            [(p['position'], p['profiles_count']) for p in positions],
+        )
+
+    def test_counts_listed_profiles(self):
+        self.assertEqual(self.get_counts(), (
+            {'Switzerland': 3, 'Nigeria': 1},
+            [('Professor', 3), ('PhD student', 1)],
+        ))
+
+    def test_follows_profile_changes(self):
+        profile = Profile.objects.get(pk=self.profiles[0].pk)
+        profile.country = self.ng
+        profile.position = 'Lecturer'
+        profile.save()
+        Profile.objects.get(name='Hidden Profile').delete()
+        self.assertEqual(self.get_counts(), (
+            {'Switzerland': 2, 'Nigeria': 2},
+            [('Professor', 2), ('PhD student', 1), ('Lecturer', 1)],
+        ))
+
+        profile.is_public = False
+        profile.save()
+        self.profiles[1].delete()
+        Profile.objects.filter(name='Ngozi Okafor').delete()
+        self.profiles[2].hard_delete()
+        self.assertEqual(self.get_counts(), ({}, []))
+
+    def test_unchanged_profile(self):
+        profile = Profile.objects.get(pk=self.profiles[0].pk)
+        profile.name = 'Ada Lovelace'
+        with CaptureQueriesContext(connection) as queries:
+            profile.save()
+        self.assertFalse([
+            query for query in queries if 'statistic' in query['sql']
+        ])
+
+    def test_rebuild_command(self):
+        CountryStatistic.objects.all().delete()
+        PositionStatistic.objects.update(profiles_count=10)
+        call_command('rebuild_profile_statistics', stdout=StringIO())
+        self.assertEqual(self.get_counts(), (
+            {'Switzerland': 3, 'Nigeria': 1},
+            [('Professor', 3), ('PhD student', 1)],
+        ))
+
+
+class ProfileFacetTests(TestCase):
+
+    def setUp(self):
+        self.eeg = Profile.objects.create(
+            name='EEG', institution='Lab', modalities='EP,MR', domains='AT',
+        )
+        self.mri = Profile.objects.create(
+            name='MRI', institution='Lab', modalities='MR', methods='CM',
+        )
+
+    def test_masks_follow_fields(self):
+        self.assertEqual(self.eeg.modalities_mask, 0b101)
+        self.assertEqual(self.mri.brain_structure_mask, 0)
+        self.mri.modalities = ['PE']
+        self.mri.save()
+        self.assertEqual(
+            Profile.objects.get(pk=self.mri.pk).modalities_mask, 0b1000,
+        )
+
+    def test_with_any(self):
+        self.assertQuerysetEqual(
+            Profile.objects.with_modalities('MR').order_by('name'),
+            ['EEG', 'MRI'], transform=lambda p: p.name,
+        )
+        self.assertQuerysetEqual(
+            Profile.objects.with_modalities('EP', 'FN'),
+            ['EEG'], transform=lambda p: p.name,
+        )
+        self.assertFalse(Profile.objects.with_domains('CM').exists())
+        self.assertTrue(Profile.objects.with_methods('CM').exists())
+
+    def test_with_all(self):
+        self.assertQuerysetEqual(
+            Profile.objects.with_modalities('EP', 'MR', match_all=True),
+            ['EEG'], transform=lambda p: p.name,
+        )
+        self.assertFalse(
+            Profile.objects.with_modalities('MR', 'PE', match_all=True).exists()
+        )
+
+    def test_labels(self):
+        self.assertEqual(
+            self.eeg.modalities_labels(),
+            ['Electrophysiology (EEG, MEG, ECoG)', 'MRI'],
+        )
+        self.assertEqual(self.eeg.domains_labels(), ['Attention'])
+        self.assertEqual(
+            LABEL_TOKENS['physio'],
+            {('modalities', 'EP'), ('modalities', 'OE')},
+        )
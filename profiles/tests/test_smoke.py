@@ -1,7 +1,20 @@
-from django.test import TestCase, override_settings
+import os
+from unittest import mock
+
+from django.contrib import messages
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.messages.storage import default_storage
+from django.contrib.sessions.backends.db import SessionStore
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
 from django.urls import reverse
 
-from ..models import User, Profile, Country
+from winrepo.settings import cache_settings
+
+from .. import cache
+from ..cache import cache_anonymous_page
+from ..models import User, Profile, Country, Publication, Recommendation
+from ..views import recent_recommendations
 
 
 class SmokeTests(TestCase):
@@ -28,6 +41,32 @@ class SmokeTests(TestCase):
         r = self.client.get(reverse('profiles:home'))
         self.assertEqual(r.status_code, 200)
 
+    def test_home_samples_recent_recommendations(self):
+        for i in range(2):
+            Recommendation.objects.create(
+                profile=self.profile, reviewer_name=f'Reviewer {i}',
+                reviewer_institution='MIT', comment=f'Comment {i}',
+            )
+        r = self.client.get(reverse('profiles:home'))
+        self.assertEqual(len(r.context['recommendations_sample']), 2)
+        self.assertContains(r, 'Comment 1')
+        with self.assertNumQueries(0):
+            self.assertEqual(len(recent_recommendations()), 2)
+        self.assertContains(
+            r, reverse('profiles:detail_username', args=['testuser']),
+        )
+
+        Recommendation.objects.create(
+            profile=self.profile, reviewer_name='Reviewer 2',
+            reviewer_institution='MIT', comment='Comment 2',
+        )
+        r = self.client.get(reverse('profiles:home'))
+        self.assertEqual(len(r.context['recommendations_sample']), 3)
+
+        self.profile.delete()
+        r = self.client.get(reverse('profiles:home'))
+        self.assertEqual(r.context['recommendations_sample'], [])
+
     @override_settings(GOOGLE_MAPS_API_KEY='testmapskey123')
     def test_home_injects_maps_api_key(self):
         # value is escapejs-encoded; an alphanumeric key passes through unchanged
@@ -131,4 +170,175 @@ class SmokeTests(TestCase):
     def test_sitemap(self):
         r = self.client.get('/sitemap.xml')
         self.assertEqual(r.status_code, 200)
-        self.assertIn('xml', r['Content-Type'])
\ No newline at end of file
+        self.assertIn('xml', r['Content-Type'])
+
+class AnonymousPageCacheTests(TestCase):
+
+    def setUp(self):
+        self.country = Country.objects.create(code='CH', name='Switzerland')
+        self.user = User.objects.create_user(
+            username='testuser', email='test@test.com', password='Pass1234!',
+        )
+        Profile.objects.create(
+            name='Ada Lovelace', institution='ETH Zurich', country=self.country,
+        )
+
+    def test_caches_anonymous_pages(self):
+        for url in (
+            reverse('profiles:index'),
+            reverse('profiles:publications'),
+            reverse('profiles:faq'),
+        ):
+            with self.subTest(url=url):
+                expected = self.client.get(url).content
+                with self.assertNumQueries(0):
+                    r = self.client.get(url)
+                self.assertEqual(r.content, expected)
+
+    def test_home_samples_cached_recommendations(self):
+        # only the pool is cached, every visitor gets a new sample
+        self.client.get(reverse('profiles:home'))
+        with self.assertNumQueries(0):
+            r = self.client.get(reverse('profiles:home'))
+        self.assertIsNotNone(r.context)
+
+    def test_varies_on_query_string_and_partial_requests(self):
+        url = reverse('profiles:index')
+        self.client.get(url)
+        self.assertNotContains(self.client.get(url, {'s': 'curie'}), 'Ada Lovelace')
+        r = self.client.get(url, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertTemplateUsed(r, 'profiles/list_rows.html')
+
+    def test_invalidated_by_changes(self):
+        url = reverse('profiles:index')
+        self.client.get(url)
+        Profile.objects.create(name='Marie Curie', institution='Sorbonne')
+        self.assertContains(self.client.get(url), 'Marie Curie')
+        # a bulk delete sends no signals
+        Profile.objects.filter(name='Marie Curie').delete()
+        self.assertNotContains(self.client.get(url), 'Marie Curie')
+
+        url = reverse('profiles:publications')
+        self.client.get(url)
+        Publication.objects.create(
+            type='BO', title='Women in science', authors='Roe, R.',
+            published_at='2021-01-01',
+        )
+        self.assertContains(self.client.get(url), 'Women in science')
+
+    def test_invalidated_by_username_changes(self):
+        user = User.objects.get(username='testuser')
+        Profile.objects.filter(name='Ada Lovelace').update(user=user)
+        Recommendation.objects.create(
+            profile=user.profile, reviewer_name='Reviewer',
+            reviewer_institution='MIT', comment='Great',
+        )
+        url = reverse('profiles:index')
+        self.client.get(url)
+        self.client.get(reverse('profiles:home'))
+
+        user.username = 'ada'
+        user.save()
+        new_link = reverse('profiles:detail_username', args=['ada'])
+        self.assertContains(self.client.get(url), new_link)
+        self.assertContains(self.client.get(reverse('profiles:home')), new_link)
+
+    def test_logged_in_users_are_not_cached(self):
+        url = reverse('profiles:faq')
+        self.client.get(url)
+        self.client.login(username='testuser', password='Pass1234!')
+        r = self.client.get(url)
+        self.assertIsNotNone(r.context)
+        self.assertContains(r, reverse('profiles:logout'))
+
+    def test_pages_with_messages_are_not_cached(self):
+        calls = []
+
+        @cache_anonymous_page()
+        def view(request):
+            calls.append(request)
+            return HttpResponse(str(len(messages.get_messages(request))))
+
+        def get():
+            request = RequestFactory().get('/messages/')
+            request.user = AnonymousUser()
+            request.session = SessionStore()
+            request._messages = default_storage(request)
+            return request
+
+        request = get()
+        messages.info(request, 'Saved')
+        self.assertEqual(view(request).content, b'1')
+        view(get())
+        view(get())
+        self.assertEqual(len(calls), 2)
+
+
+class CacheTests(TestCase):
+
+    def test_versioned_entries_and_counters(self):
+        values = iter(range(10))
+        hits = cache.stats().get('tests', {}).get('hits', 0)
+        self.assertEqual(cache.get_or_set('tests', ('a',), lambda: next(values)), 0)
+        self.assertEqual(cache.get_or_set('tests', ('a',), lambda: next(values)), 0)
+        self.assertEqual(cache.stats()['tests']['hits'], hits + 1)
+
+        cache.bump_version('tests')
+        self.assertEqual(
+            cache.get_or_set('tests', ('a',), lambda: next(values), alias='api'),
+            1,
+        )
+
+    @override_settings(VERSIONED_CACHE=False)
+    def test_entries_not_cached_without_shared_versions(self):
+        values = iter(range(10))
+        self.assertEqual(cache.get_or_set('tests', ('a',), lambda: next(values)), 0)
+        self.assertEqual(
+            cache.get_or_set('tests', ('a',), lambda: next(values), alias='api'),
+            1,
+        )
+
+    @override_settings(VERSIONED_CACHE=False)
+    def test_pages_not_cached_without_shared_versions(self):
+        Country.objects.create(code='CH', name='Switzerland')
+        url = reverse('profiles:index')
+        self.client.get(url)
+        self.assertIsNotNone(self.client.get(url).context)
+
+    def test_cache_settings(self):
+        with mock.patch.dict(os.environ, {
+            'CACHE_BACKEND': 'file', 'CACHE_LOCATION': '/tmp/winrepo',
+            'CACHE_PAGES_BACKEND': 'dummy',
+        }):
+            self.assertEqual(cache_settings('api'), {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': '/tmp/winrepo/api',
+                'KEY_PREFIX': 'winrepo:api',
+            })
+            self.assertEqual(
+                cache_settings('pages')['BACKEND'],
+                'django.core.cache.backends.dummy.DummyCache',
+            )
+
+        with mock.patch.dict(os.environ, {'CACHE_BACKEND': 'db'}):
+            self.assertEqual(cache_settings('pages'), {
+                'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+                'LOCATION': 'winrepo_cache',
+                'KEY_PREFIX': 'winrepo:pages',
+            })
+
+        # shared by the processes in production
+        with mock.patch('winrepo.settings.DEBUG', False):
+            self.assertEqual(
+                cache_settings('default')['BACKEND'],
+                'django.core.cache.backends.filebased.FileBasedCache',
+            )
+
+        # without django-redis or a server, local memory
+        with mock.patch.dict(os.environ, {'CACHE_BACKEND': 'redis'}), \
+                self.assertWarns(UserWarning):
+            self.assertEqual(cache_settings('default'), {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': 'default',
+                'KEY_PREFIX': 'winrepo:default',
+            })
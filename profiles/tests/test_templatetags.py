@@ -0,0 +1,76 @@
+import threading
+
+from django.template import Context, Engine
+from django.test import SimpleTestCase
+
+
+class BlockIncludeTests(SimpleTestCase):
+
+    def setUp(self):
+        self.engine = Engine(
+            libraries={'blockinclude': 'profiles.templatetags.blockinclude'},
+            loaders=[('django.template.loaders.locmem.Loader', {
+                'base.html': '[{% block content %}{% endblock %}]',
+                'card.html': '<{{ name }}|{% block buttons %}none{% endblock %}>',
+                'page.html': (
+                    '{% extends "base.html" %}{% load blockinclude %}'
+                    '{% block content %}'
+                    '{% blockinclude "card.html" with name=name %}'
+                    '{% block buttons %}{{ name }} button{% endblock %}'
+                    '{% endblockinclude %}'
+                    '{% include "card.html" %}{{ name }}'
+                    '{% endblock %}'
+                ),
+                'plain.html': (
+                    '{% load blockinclude %}'
+                    '{% blockinclude "card.html" with name="Ada" only %}'
+                    '{% block buttons %}ok{% endblock %}'
+                    '{% endblockinclude %}'
+                ),
+            })],
+        )
+
+    def test_overrides_blocks(self):
+        template = self.engine.get_template('page.html')
+        self.assertEqual(
+            template.render(Context({'name': 'Ada'})),
+            '[<Ada|Ada button><Ada|none>Ada]',
+        )
+        self.assertEqual(
+            self.engine.get_template('plain.html').render(Context()),
+            '<Ada|ok>',
+        )
+
+    def test_does_not_modify_included_template(self):
+        template = self.engine.get_template('page.html')
+        card = self.engine.get_template('card.html')
+        names = [node.name for node in card.nodelist if hasattr(node, 'name')]
+        template.render(Context({'name': 'Ada'}))
+        self.assertEqual(
+            [node.name for node in card.nodelist if hasattr(node, 'name')],
+            names,
+        )
+
+    def test_concurrent_renders(self):
+        template = self.engine.get_template('page.html')
+        results = []
+
+        def render(name):
+            for _ in range(200):
+                results.append(
+                    (name, template.render(Context({'name': name})))
+                )
+
+        threads = [
+            threading.Thread(target=render, args=(name,))
+            for name in ('Ada', 'Grace', 'Marie')
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for name, result in results:
+            self.assertEqual(
+                result, f'[<{name}|{name} button><{name}|none>{name}]',
+            )
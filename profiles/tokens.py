@@ -75,3 +75,16 @@ class UserEmailChangeToken(Token):
             sub=user.id,
             email=email,
         )
+
+
+class ProfileChangesToken(Token):
+
+    audience = "profile_changes"
+    expires_in = 60 * 60 * 24 * 30
+
+    @classmethod
+    def generate(cls, since, **extra):
+        return super().generate(
+            **extra,
+            since=since.timestamp(),
+        )
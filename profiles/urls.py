@@ -11,6 +11,7 @@ from rest_framework import routers
 from .sitemaps import HomeSitemap, FaqSitemap, AboutSitemap, \
      SponsorsSitemap, ListSitemap, ProfilesSitemap
 from . import views
+from .cache import cache_anonymous_page
 
 router = routers.DefaultRouter()
 router.register(r'api/countries', views.RepresentedCountriesViewSet)
@@ -59,32 +60,32 @@ urlpatterns = [
     path('repo/<str:user__username>/claim/', views.ProfileClaim.as_view(), name='claim_profile_username'),
 
     path('publications/', views.PublicationsList.as_view(), name='publications'),
-    path('faq/', TemplateView.as_view(
+    path('faq/', cache_anonymous_page()(TemplateView.as_view(
         template_name='profiles/faq.html',
         extra_context={'updated_at': faq_updated_at}
-    ), name='faq'),
-    path('tips/', TemplateView.as_view(
+    )), name='faq'),
+    path('tips/', cache_anonymous_page()(TemplateView.as_view(
         template_name='profiles/tips.html',
         extra_context={'updated_at': tips_updated_at}
-    ), name='tips'),
-    path('people/', TemplateView.as_view(
+    )), name='tips'),
+    path('people/', cache_anonymous_page()(TemplateView.as_view(
         template_name='profiles/people.html',
         extra_context={'updated_at': people_updated_at}
-    ), name='people'),
-    path('sponsors/', TemplateView.as_view(
+    )), name='people'),
+    path('sponsors/', cache_anonymous_page()(TemplateView.as_view(
         template_name='profiles/sponsors.html',
         extra_context={'updated_at': sponsors_updated_at}
-    ), name='sponsors'),
+    )), name='sponsors'),
     # Keep the old /about/ URL working: permanently redirect it to /people/.
     path('about/', RedirectView.as_view(pattern_name='profiles:people', permanent=True), name='about'),
-    path('academic_advice/', TemplateView.as_view(
+    path('academic_advice/', cache_anonymous_page()(TemplateView.as_view(
         template_name='profiles/academic_advice.html',
         extra_context={'updated_at': academic_advice_updated_at}
-    ), name='academic_advice'),
-    path('transparency_calculator/', TemplateView.as_view(
+    )), name='academic_advice'),
+    path('transparency_calculator/', cache_anonymous_page()(TemplateView.as_view(
         template_name='profiles/transparency_calculator.html',
         extra_context={'updated_at': transparency_calculator_updated_at}
-    ), name='transparency_calculator'),
+    )), name='transparency_calculator'),
 
     path('profiles-autocomplete/', views.ProfilesAutocomplete.as_view(), name='profiles_autocomplete'),
     path('countries-autocomplete/', views.CountriesAutocomplete.as_view(), name='countries_autocomplete'),
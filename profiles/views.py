@@ -1,10 +1,9 @@
 from datetime import datetime, timedelta
+import hashlib
 import logging
 import random
 
 logger = logging.getLogger(__name__)
-import re
-import time
 from functools import reduce
 from operator import and_, or_
 
@@ -19,15 +18,18 @@ from django.contrib.auth import (
 from django.contrib.auth.forms import PasswordResetForm, SetPasswordForm
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.messages.views import SuccessMessageMixin
-from django.db.models import Count, Q
+from django.db.models import F, Q
+from django.http import FileResponse, StreamingHttpResponse
 from django.http.response import Http404
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.decorators import method_decorator
+from django.utils.cache import patch_vary_headers
 from django.utils.http import url_has_allowed_host_and_scheme
-from django.views.decorators.cache import never_cache
+from django.views.decorators.cache import cache_control, never_cache
 from django.views.decorators.debug import sensitive_post_parameters
+from django.views.decorators.http import condition
 from django.views.generic import (
     CreateView,
     DetailView,
@@ -37,13 +39,17 @@ from django.views.generic import (
 )
 from django.views.generic.edit import ModelFormMixin
 from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
 from dal.autocomplete import Select2QuerySetView
 
+from . import cache
 from .emails import (
     profile_update_email,
+    send_email,
     user_create_confirm_email,
-    user_reset_password_email,
     user_update_email,
     user_update_email_email,
 )
@@ -58,11 +64,42 @@ from .forms import (
     UserProfileDeleteForm,
     UserProfileForm,
 )
-from .models import Country, Profile, Publication, Recommendation, User
+from .models import (
+    FACETS,
+    Country,
+    PasswordResetRequest,
+    PositionStatistic,
+    Profile,
+    Publication,
+    Recommendation,
+    Seniority,
+    User,
+    facet_q,
+)
+from .pagination import CachedCountPaginator, CursorPaginator, published_after
+from .search import (
+    FACET_RESOLVER,
+    PUBLICATION_TYPE_RESOLVER,
+    get_backend,
+    normalize,
+    split_terms,
+)
+from .snapshots import (
+    dataset_version,
+    find_snapshot,
+    schedule_snapshot,
+    search_dataset,
+    snapshot_exists,
+)
+from .renderers import ColumnarJSONRenderer
 from .serializers import (
-    CountrySerializer, PositionsCountSerializer, ProfileSearchSerializer,
+    CountrySerializer,
+    PositionsCountSerializer,
+    ProfileColumnarSerializer,
+    ProfileSearchSerializer,
 )
 from .tokens import (
+    ProfileChangesToken,
     UserCreateToken,
     UserEmailChangeToken,
     UserPasswordResetToken,
@@ -74,31 +111,31 @@ logger = logging.getLogger(__name__)
 def safe_send_email(email_message, log_message):
     """Send an email without breaking the request on backend failure."""
     try:
-        email_message.send()
+        send_email(email_message)
     except Exception:
         logger.exception(log_message)
 
 
+HOME_RECOMMENDATIONS = 6
+
+
+def recent_recommendations():
+    """The latest recommendations, with their profile, sampled by the home page."""
+    return cache.get_or_set('recommendations', ('recent',), lambda: list(
+        Recommendation.objects.filter(
+            profile__deleted_at__isnull=True,
+        ).select_related('profile__user').order_by('-id')[:100]
+    ))
+
+
 class Home(ListView):
     template_name = 'profiles/home.html'
     context_object_name = 'recommendations_sample'
     model = Recommendation
 
     def get_queryset(self):
-        top_reco = Recommendation.objects.filter(
-            profile__deleted_at__isnull=True
-        ).order_by('-id')[:100]
-
-        nb_samples = 6
-        if len(top_reco) == 0:
-            sample = []
-        else:
-            sample = [
-                top_reco[i]
-                for i in random.sample(range(len(top_reco)), nb_samples)
-            ]
-
-        return sample
+        pool = recent_recommendations()
+        return random.sample(pool, min(HOME_RECOMMENDATIONS, len(pool)))
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -106,6 +143,7 @@ class Home(ListView):
         return context
 
 
+@method_decorator(cache.cache_anonymous_page('profiles', 'recommendations'), name='dispatch')
 class ListProfiles(ListView):
     template_name = 'profiles/list.html'
     context_object_name = 'profiles'
@@ -121,82 +159,91 @@ class ListProfiles(ListView):
         # q_st = ~Q(pk=None)  # always true
         q_st = Q(is_public=True, deleted_at__isnull=True)
 
-        if s is not None:
-            # split search terms and filter empty words
-            # (if successive spaces)
-            search_terms = list(filter(None, s.split(' ')))
-            for st in search_terms:
-                st_regex = re.compile(f'.*{st}.*', re.IGNORECASE)
+        backend = get_backend()
+        search_terms = split_terms(s)
+        for st in search_terms:
+            # profiles having a research field whose label matches
+            matching_facets = [
+                facet_q(facet, codes)
+                for facet, codes in FACET_RESOLVER.resolve(st).items()
+            ]
 
-                matching_structures = list(
-                    Q(brain_structure__contains=code)
-                    for code, name in Profile.get_structure_choices()
-                    if st_regex.match(name)
-                )
-                matching_modalities = list(
-                    Q(modalities__contains=code)
-                    for code, name in Profile.get_modalities_choices()
-                    if st_regex.match(name)
-                )
-                matching_methods = list(
-                    Q(methods__contains=code)
-                    for code, name in Profile.get_methods_choices()
-                    if st_regex.match(name)
-                )
-                matching_domains = list(
-                    Q(domains__contains=code)
-                    for code, name in Profile.get_domains_choices()
-                    if st_regex.match(name)
-                )
+            # the search document already holds name, institution,
+            # position, country, keywords and field labels
+            st_conditions = [backend.term_filter(st)] + matching_facets
 
-                st_conditions = [
-                    Q(name__icontains=st),
-                    Q(institution__icontains=st),
-                    Q(position__icontains=st),
-                    Q(brain_structure__icontains=st),
-                    Q(country__name__icontains=st),
-                    Q(keywords__icontains=st),
-                ] + matching_structures \
-                    + matching_modalities \
-                    + matching_methods \
-                    + matching_domains
-
-                q_st = and_(reduce(or_, st_conditions), q_st)
+            q_st = and_(reduce(or_, st_conditions), q_st)
 
         # create filter on under-represented countries
         if is_underrepresented:
-            q_ur = Q(country__is_under_represented=True)
+            q_ur = Q(country_is_under_represented=True)
         else:
             q_ur = ~Q(pk=None)  # always true
 
         # create filter on senior profiles
         if is_senior:
-            senior_profiles_keywords = (
-                'Senior',
-                'Lecturer',
-                'Professor',
-                'Director',
-                'Principal',
-            )
-            # position must contain one of the words (case insensitive)
-            q_senior = reduce(
-                or_,
-                (Q(position__icontains=x) for x in senior_profiles_keywords),
-            )
+            q_senior = Q(seniority=Seniority.SENIOR)
         else:
             q_senior = ~Q(pk=None)  # always true
 
-        # apply filters
+        # apply filters, fetching everything the rows display at once
         profiles_list = Profile.objects.filter(
-            q_st, q_ur, q_senior
-        ).order_by('-published_at')
-
-        return profiles_list
-
-
+            q_st, q_ur, q_senior,
+        ).select_related('user', 'country').with_recommendation_count()
+
+        self.search_terms = search_terms
+        # AND of the terms: neither their order nor their case matters
+        self.count_key = (
+            tuple(sorted({normalize(st) for st in search_terms})),
+            is_underrepresented,
+            is_senior,
+        )
+        if search_terms:
+            # most relevant first when searching
+            return backend.annotate_rank(
+                profiles_list, search_terms,
+            ).order_by('-search_rank', '-published_at')
+
+        return profiles_list.order_by('-published_at', '-id')
+
+    def paginate_queryset(self, queryset, page_size):
+        # relevance ranked searches and legacy ?page= links use page numbers
+        if self.search_terms or self.page_kwarg in self.request.GET:
+            return super().paginate_queryset(queryset, page_size)
+
+        paginator = CursorPaginator(queryset, page_size, self.count_key)
+        page = paginator.page(self.request.GET.get('cursor'))
+        return (paginator, page, page.object_list, page.has_next())
+
+    def get_paginator(self, *args, **kwargs):
+        return CachedCountPaginator(*args, count_key=self.count_key, **kwargs)
+
+    def is_partial(self):
+        return (
+            'partial' in self.request.GET
+            or self.request.headers.get('x-requested-with') == 'XMLHttpRequest'
+        )
+
+    def get_template_names(self):
+        # infinite scroll only needs the rows and the next link
+        if self.is_partial():
+            return ['profiles/list_rows.html']
+        return super().get_template_names()
+
+    def render_to_response(self, context, **response_kwargs):
+        response = super().render_to_response(context, **response_kwargs)
+        patch_vary_headers(response, ('X-Requested-With',))
+        return response
+
+
+@method_decorator(cache.cache_anonymous_page('profiles', 'recommendations'), name='dispatch')
 class ProfileDetail(DetailView):
     model = Profile
-    queryset = Profile.objects.filter(is_public=True)
+    # the latest recommendation is part of the cache key of the page body,
+    # whose recommendations are only loaded when it is rendered
+    queryset = Profile.objects.filter(
+        is_public=True,
+    ).select_related('country', 'user').with_latest_recommendation()
     slug_url_kwarg = 'user__username'
     slug_field = 'user__username'
     query_pk_and_slug = True
@@ -251,15 +298,13 @@ class UserProfileClaimView(LoginRequiredMixin, TemplateView):
         return super().get(request, *args, **kwargs)
 
     def get_queryset(self, search=None):
-        profiles = Profile.objects.all()
-        qs = Q(user__isnull=True)
+        profiles = Profile.objects.filter(user__isnull=True)
 
         if search:
-            terms = filter(None, search.strip().split(' '))
-            for term in terms:
-                qs &= Q(name__icontains=term)
+            profiles = get_backend().search(
+                profiles, split_terms(search.strip()),
+            ).order_by('-search_rank', 'name')
 
-        profiles = profiles.filter(qs)
         return profiles[:5]
 
     def get_context_data(self, **kwargs):
@@ -376,11 +421,11 @@ class UserEditView(
 
                 try:
                     # send confirmation email to the new address
-                    user_update_email_email(
+                    send_email(user_update_email_email(
                         self.request,
                         form.instance,
                         token,
-                    ).send()
+                    ))
                 except Exception:
                     logger.exception(
                         'Failed to send email-change confirmation email.'
@@ -484,7 +529,7 @@ class UserCreateView(CreateView):
         token = UserCreateToken.generate(self.object)
         self.request.session['user_confirmation_token'] = token
         try:
-            user_create_confirm_email(self.request, self.object, token).send()
+            send_email(user_create_confirm_email(self.request, self.object, token))
         except Exception:
             logger.exception('Failed to send signup confirmation email to %s', self.object.email)
             messages.error(
@@ -595,13 +640,12 @@ class UserPasswordResetView(FormView):
         return super().get(request, *args, **kwargs)
 
     def form_valid(self, form):
-        try:
-            email = form.cleaned_data['email']
-            user = User.objects.get(email=email)
-            token = UserPasswordResetToken.generate(user)
-            user_reset_password_email(self.request, user, token).send()
-        except User.DoesNotExist:
-            time.sleep(4)
+        # the same answer, as fast, whether the account exists or not: the
+        # account is looked up by the send_outbox command
+        PasswordResetRequest.objects.create(
+            email=form.cleaned_data['email'],
+            base_url=self.request.build_absolute_uri('/'),
+        )
 
         messages.success(self.request, self.success_message)
         return super().form_valid(form)
@@ -744,6 +788,7 @@ class ProfileClaim(SuccessMessageMixin, FormView, LoginRequiredMixin):
         return super().get_context_data(**context)
 
 
+@method_decorator(cache.cache_anonymous_page('publications'), name='dispatch')
 class PublicationsList(ListView):
     template_name = 'publications/list.html'
     context_object_name = 'publications'
@@ -772,13 +817,14 @@ class PublicationsList(ListView):
         if s:
             # split search terms and filter empty words
             # (if successive spaces)
-            search_terms = list(filter(None, s.split(' ')))
+            search_terms = split_terms(s)
             for st in search_terms:
-                st_regex = re.compile(f'.*{st}.*', re.IGNORECASE)
+                matching_types = PUBLICATION_TYPE_RESOLVER.resolve(st)
                 st_conditions = [
                     Q(title__icontains=st),
                     Q(authors__icontains=st),
                     Q(description__icontains=st),
+                    Q(type__in=matching_types.get('type', ())),
                 ]
                 q_st = q_st & reduce(or_, st_conditions)
 
@@ -790,14 +836,9 @@ class ProfilesAutocomplete(Select2QuerySetView):
         profiles = Profile.objects.all()
 
         if self.q:
-            qs = ~Q(pk=None)
-            search_terms = filter(None, self.q.strip().split(' '))
-            for st in search_terms:
-                qs &= (
-                    Q(name__icontains=st) |
-                    Q(institution__icontains=st)
-                )
-            profiles = profiles.filter(qs)
+            profiles = get_backend().search(
+                profiles, split_terms(self.q.strip()),
+            ).order_by('-search_rank', 'name')
 
         return profiles
 
@@ -816,33 +857,213 @@ class CountriesAutocomplete(Select2QuerySetView):
         return countries
 
 
+class StreamingListMixin:
+    """
+    Streams the JSON list of a queryset browsed by ``-published_at, -id``.
+
+    The rows are read with keyset queries of ``stream_chunk_size`` rows, each
+    chunk serialized and sent on its own, so the whole list is never held in
+    memory. Unlike ``.iterator()``, this also holds on MySQL, where
+    mysqlclient buffers whole results without a server-side cursor.
+    """
+    stream_chunk_size = 500
+
+    def list(self, request, *args, **kwargs):
+        if (
+            request.accepted_renderer.format != 'json'
+            or self.paginator is not None
+        ):
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        return StreamingHttpResponse(
+            self.stream_list(queryset),
+            content_type=request.accepted_renderer.media_type,
+        )
+
+    def stream_list(self, queryset):
+        queryset = queryset.order_by('-published_at', '-id')
+        chunk = list(queryset[:self.stream_chunk_size])
+        separator = b''
+        yield b'['
+        while chunk:
+            content = self.request.accepted_renderer.render(
+                self.get_serializer(chunk, many=True).data,
+                self.request.accepted_media_type,
+                self.get_renderer_context(),
+            )
+            # the items, without the brackets of the chunk list
+            yield separator + content[1:-1]
+            separator = b','
+
+            if len(chunk) < self.stream_chunk_size:
+                break
+            last = chunk[-1]
+            chunk = list(queryset.filter(
+                published_after(last.published_at, last.pk),
+            )[:self.stream_chunk_size])
+        yield b']'
+
+
 class RepresentedCountriesViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = Country.objects.annotate(
-        profiles_count=Count('profiles')
-    ).filter(profiles_count__gt=0)
+    queryset = Country.objects.filter(statistic__isnull=False).annotate(
+        profiles_count=F('statistic__profiles_count'),
+    )
     serializer_class = CountrySerializer
     authentication_classes = []
 
 
 class TopPositionsViewSet(viewsets.ReadOnlyModelViewSet):
     authentication_classes = []
-    queryset = Profile.objects.all() \
-        .values('position') \
-        .annotate(profiles_count=Count('id')) \
+    queryset = PositionStatistic.objects \
+        .values('position', 'profiles_count') \
         .order_by('-profiles_count')
     serializer_class = PositionsCountSerializer
 
 
-class ProfileSearchViewSet(viewsets.ReadOnlyModelViewSet):
+CHANGES_OVERLAP = timedelta(minutes=1)
+
+
+def is_prebuilt(request):
+    """Whether the search API answer is the whole dataset, see profiles.snapshots."""
+    return request.accepted_renderer.format == 'json' and not any(
+        param in request.query_params for param in ('fields', *FACETS)
+    )
+
+
+def request_dataset_version(request):
+    if not hasattr(request, 'dataset_version'):
+        request.dataset_version = dataset_version()
+    return request.dataset_version
+
+
+def request_snapshot(request):
+    """(path, encoding) of the snapshot answering ``request``, if any."""
+    if not hasattr(request, 'snapshot'):
+        request.snapshot = is_prebuilt(request) and find_snapshot(
+            request_dataset_version(request),
+            request.META.get('HTTP_ACCEPT_ENCODING', ''),
+        ) or None
+    return request.snapshot
+
+
+def profiles_etag(request, *args, **kwargs):
+    """
+    Version of the search API answer, computed without serializing anything.
+    """
+    snapshot = request_snapshot(request)
+    fingerprint = (
+        request_dataset_version(request),
+        # facet filters and representation
+        request.GET.urlencode(), request.META.get('HTTP_ACCEPT'),
+        # the compressed snapshots are other bytes
+        snapshot and snapshot[1],
+    )
+    return hashlib.md5(repr(fingerprint).encode()).hexdigest()
+
+
+class ProfileSearchViewSet(
+    StreamingListMixin, viewsets.ReadOnlyModelViewSet,
+):
     """All public profiles with fields needed for client-side search."""
     authentication_classes = []
     pagination_class = None
     serializer_class = ProfileSearchSerializer
-    queryset = Profile.objects.filter(
-        is_public=True, deleted_at__isnull=True,
-    ).select_related('country', 'user').annotate(
-        recommendation_count=Count('recommendations'),
-    ).order_by('-published_at')
+    renderer_classes = [
+        *api_settings.DEFAULT_RENDERER_CLASSES, ColumnarJSONRenderer,
+    ]
+    queryset = search_dataset()
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+
+        # e.g. ?modalities=EP,MR&domains=AT
+        for facet in FACETS:
+            codes = self.request.query_params.get(facet)
+            if codes:
+                queryset = queryset.with_facet(facet, codes)
+
+        return queryset
+
+    def get_fields(self):
+        """Fields picked with ``?fields=name,position``, None for all."""
+        fields = self.request.query_params.get('fields')
+        return fields.split(',') if fields else None
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fields', self.get_fields())
+        return super().get_serializer(*args, **kwargs)
+
+    # clients revalidate their copy and get a 304 while nothing changed
+    @method_decorator(cache_control(no_cache=True))
+    @method_decorator(condition(etag_func=profiles_etag))
+    def list(self, request, *args, **kwargs):
+        if request.accepted_renderer.format == 'columnar':
+            queryset = self.filter_queryset(self.get_queryset())
+            # cached under the dataset version of the ETag, never stale
+            return Response(cache.get_or_set(
+                'profiles',
+                (
+                    'columnar',
+                    request_dataset_version(request),
+                    request.GET.urlencode(),
+                ),
+                lambda: ProfileColumnarSerializer(queryset, self.get_fields()).data,
+                alias='api',
+            ))
+
+        # the whole dataset is prebuilt, see profiles.snapshots
+        if not is_prebuilt(request):
+            return super().list(request, *args, **kwargs)
+        snapshot = request_snapshot(request)
+        if snapshot:
+            response = self.snapshot_response(*snapshot)
+        else:
+            # rebuilt when missing, not when the client refuses compression
+            if not snapshot_exists(request_dataset_version(request)):
+                schedule_snapshot()
+            response = super().list(request, *args, **kwargs)
+        patch_vary_headers(response, ('Accept', 'Accept-Encoding'))
+        return response
+
+    @action(detail=False)
+    def changes(self, request):
+        """
+        Changes of the dataset since ``?since=<token>``: the listed profiles
+        created or updated, and the ids of the ones deleted or made private.
+        Without a valid token, ``reset`` asks the client to load the whole
+        dataset, which is at least as recent as the new token.
+        """
+        now = timezone.now()
+        payload = ProfileChangesToken.check(request.query_params.get('since', ''))
+        data = {
+            'token': ProfileChangesToken.generate(now),
+            'count': search_dataset().count(),
+            'reset': payload is None,
+            'changed': [],
+            'removed': [],
+        }
+        if payload is None:
+            return Response(data)
+
+        # catch up with the transactions still running when the token was
+        # issued, the client ignores the repeated changes
+        since = datetime.fromtimestamp(payload['since'], tz=timezone.utc)
+        since -= CHANGES_OVERLAP
+        changed = search_dataset().filter(updated_at__gt=since)
+        data['changed'] = self.get_serializer(changed, many=True).data
+        data['removed'] = list(Profile.all_objects.filter(
+            Q(is_public=False) | Q(deleted_at__isnull=False),
+            updated_at__gt=since,
+        ).values_list('pk', flat=True))
+        return Response(data)
+
+    def snapshot_response(self, path, encoding):
+        response = FileResponse(
+            open(path, 'rb'), content_type='application/json',
+        )
+        response['Content-Encoding'] = encoding
+        return response
 
 
 def transparency_calculator(request):
@@ -34,11 +34,41 @@ python manage.py collectstatic --noinput
 echo "==> Running migrations..."
 python manage.py migrate --noinput
 
+echo "==> Creating the cache tables..."
+# only used with CACHE_BACKEND=db, the file cache needs no setup
+python manage.py createcachetable
+
 echo "==> Reloading webapp..."
 curl -s \
   -X POST \
   -H "Authorization: Token ${PYTHONANYWHERE_TOKEN}" \
   "https://www.pythonanywhere.com/api/v0/user/${PYTHONANYWHERE_USERNAME}/webapps/${PYTHONANYWHERE_DOMAIN}/reload/"
 
+# The password reset e-mails (and all of them with EMAIL_OUTBOX) are sent by
+# the send_outbox worker, an always-on task created on the first deploy and
+# restarted on the next ones to run the new code.
+echo ""
+echo "==> Restarting the e-mail worker..."
+ALWAYS_ON_URL="https://www.pythonanywhere.com/api/v0/user/${PYTHONANYWHERE_USERNAME}/always_on/"
+WORKER_COMMAND="cd ${BASEDIR} && ${VIRTUAL_ENV}/bin/python manage.py send_outbox --loop"
+WORKER_ID=$(
+  curl -s -H "Authorization: Token ${PYTHONANYWHERE_TOKEN}" "${ALWAYS_ON_URL}" |
+  python -c 'import json, sys; print(next((str(task["id"]) for task in json.load(sys.stdin) if task["command"] == sys.argv[1]), ""))' "${WORKER_COMMAND}"
+)
+if [[ -z "${WORKER_ID}" ]]; then
+  curl -s \
+    -X POST \
+    -H "Authorization: Token ${PYTHONANYWHERE_TOKEN}" \
+    --data-urlencode "command=${WORKER_COMMAND}" \
+    --data-urlencode "description=WiNRepo e-mail worker" \
+    --data "enabled=true" \
+    "${ALWAYS_ON_URL}"
+else
+  curl -s \
+    -X POST \
+    -H "Authorization: Token ${PYTHONANYWHERE_TOKEN}" \
+    "${ALWAYS_ON_URL}${WORKER_ID}/restart/"
+fi
+
 echo ""
 echo "==> Deploy complete."
@@ -1,6 +1,9 @@
+import importlib.util
 import os
 import time
+import warnings
 from decouple import config
+from django.core.exceptions import ImproperlyConfigured
 
 STATIC_VERSION = int(time.time())  # Unique timestamp to force reload
 
@@ -94,6 +97,100 @@ DATABASES = {
 
 DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
 
+# Dotted path to a profiles.search backend; picked from the database
+# vendor when empty (MySQL FULLTEXT, SQLite FTS5 or plain icontains).
+SEARCH_BACKEND = config('SEARCH_BACKEND', default='')
+
+# Where the prebuilt /api/profiles/ snapshots are written (disabled when
+# empty), and the minimum delay in seconds between two rebuilds.
+PROFILES_SNAPSHOT_DIR = config(
+    'PROFILES_SNAPSHOT_DIR', default=os.path.join(BASE_DIR, 'snapshots'),
+)
+PROFILES_SNAPSHOT_DELAY = config('PROFILES_SNAPSHOT_DELAY', default=5, cast=int)
+
+# Cache aliases, each picked from CACHE_BACKEND and CACHE_LOCATION or their
+# CACHE_<ALIAS>_BACKEND and CACHE_<ALIAS>_LOCATION overrides: locmem (the
+# default with DEBUG), file (a directory, cache/ by default, the default
+# otherwise), db (a table, winrepo_cache by default, made by `manage.py
+# createcachetable`), redis (a redis:// URL, with the django-redis package)
+# or dummy.
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'db': 'django.core.cache.backends.db.DatabaseCache',
+    'redis': 'django_redis.cache.RedisCache',
+    'dummy': 'django.core.cache.backends.dummy.DummyCache',
+}
+SHARED_CACHE_BACKENDS = [
+    CACHE_BACKENDS[backend] for backend in ('file', 'db', 'redis')
+]
+
+
+def cache_settings(alias):
+    backend = config(
+        f'CACHE_{alias.upper()}_BACKEND',
+        # shared by the processes in production, see VERSIONED_CACHE
+        default=config('CACHE_BACKEND', default='locmem' if DEBUG else 'file'),
+    )
+    location = config(
+        f'CACHE_{alias.upper()}_LOCATION',
+        default=config('CACHE_LOCATION', default=''),
+    )
+    if backend not in CACHE_BACKENDS:
+        raise ImproperlyConfigured(f'Unknown cache backend {backend!r}')
+    if backend == 'redis' and (
+        not location or importlib.util.find_spec('django_redis') is None
+    ):
+        warnings.warn(
+            f'The {alias} cache needs django-redis and a CACHE_LOCATION, '
+            'falling back on local memory'
+        )
+        backend = 'locmem'
+
+    if backend == 'locmem':
+        location = alias
+    elif backend == 'file':
+        location = os.path.join(location or os.path.join(BASE_DIR, 'cache'), alias)
+    elif backend == 'db':
+        location = location or 'winrepo_cache'
+    return {
+        'BACKEND': CACHE_BACKENDS[backend],
+        'LOCATION': location,
+        'KEY_PREFIX': f'winrepo:{alias}',
+    }
+
+
+# default: versions and small values, pages: anonymous pages, api: API
+# answers, sessions: sessions on top of the database when shared
+CACHES = {
+    alias: cache_settings(alias)
+    for alias in ('default', 'pages', 'api', 'sessions')
+}
+
+# a local memory cache is not shared by the processes, it could keep a
+# session a process ended
+if CACHES['sessions']['BACKEND'] in SHARED_CACHE_BACKENDS:
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+    SESSION_CACHE_ALIAS = 'sessions'
+
+# Likewise for the versioned entries of profiles.cache (anonymous pages,
+# counts, API answers): their versions live in the default cache and the
+# pages in the pages cache, and a process would keep serving what another
+# invalidated. They are only cached when both are shared, or in development
+# (a single runserver process); VERSIONED_CACHE forces either way.
+SHARED_VERSIONS = all(
+    CACHES[alias]['BACKEND'] in SHARED_CACHE_BACKENDS
+    for alias in ('default', 'pages')
+)
+VERSIONED_CACHE = config(
+    'VERSIONED_CACHE', default=DEBUG or SHARED_VERSIONS, cast=bool,
+)
+if not (VERSIONED_CACHE or DEBUG or SHARED_VERSIONS):
+    warnings.warn(
+        'The default and pages caches are not shared by the processes, '
+        'the pages, counts and API answers are not cached'
+    )
+
 LOGIN_URL = '/login'
 LOGIN_REDIRECT_URL = 'profiles:user'
 LOGOUT_REDIRECT_URL = 'profiles:home'
@@ -200,6 +297,11 @@ EMAIL_FROM = config('DEFAULT_FROM_EMAIL')
 EMAIL_REPLY_TO = config('DEFAULT_REPLY_TO_EMAIL')
 EMAIL_SUBJECT_PREFIX = 'WiNRepo - '
 
+# queue the e-mails of the requests in the database, for the send_outbox
+# command, which tools/refresh_env.sh runs as an always-on task (it also
+# queues the password reset e-mails, whatever EMAIL_OUTBOX)
+EMAIL_OUTBOX = config('EMAIL_OUTBOX', default=False, cast=bool)
+
 SITE_ID = config('SITE_ID', cast=int, default=1)
 ROBOTS_CACHE_TIMEOUT = 60 * 60 * 24
 
@@ -214,8 +316,11 @@ REST_FRAMEWORK = {
     ]
 }
 
+# the partial indexes of the profiles are whole ones on MySQL
+SILENCED_SYSTEM_CHECKS = ['models.W037']
+
 if DEBUG:
-    SILENCED_SYSTEM_CHECKS = ['captcha.recaptcha_test_key_error']
+    SILENCED_SYSTEM_CHECKS += ['captcha.recaptcha_test_key_error']
 
     LOGGING = {
         'version': 1,